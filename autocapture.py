@@ -0,0 +1,68 @@
+import numpy as np
+
+from pages import order_quad, quad_sharpness
+
+
+class AutoCapture:
+    # Decides when to add a page without the operator clicking. It fires once
+    # the page corners have stayed within max_motion pixels for `steady`
+    # seconds and the frame is sharp, then stays disarmed until the page
+    # is taken away (no quad for `gone` seconds) or moved by more than
+    # max_change pixels, so one sheet is never added twice.
+    def __init__(self, steady=0.6, max_motion=2.0, min_sharpness=100.0, max_change=40.0,
+                 gone=0.3, sharpness_scale=4):
+        self.steady = steady
+        self.max_motion = max_motion
+        self.min_sharpness = min_sharpness
+        self.max_change = max_change
+        self.gone = gone
+        self.sharpness_scale = sharpness_scale
+
+        self.run_start = None  # (timestamp, quad) where the current steady run began
+        self.armed = True
+        self.captured_quad = None
+        self.missing_since = None
+        self.last_sharpness = None
+
+    def reset(self):
+        self.run_start = None
+        self.armed = True
+        self.captured_quad = None
+        self.missing_since = None
+
+    def update(self, timestamp, quad, frame):
+        # Feed one detection; returns True when a page should be captured
+        if quad is None:
+            self.run_start = None
+            if self.missing_since is None:
+                self.missing_since = timestamp
+            elif not self.armed and timestamp - self.missing_since >= self.gone:
+                self.armed = True  # The sheet was taken away
+            return False
+        self.missing_since = None
+
+        if not self.armed:
+            if _corner_distance(quad, self.captured_quad) <= self.max_change:
+                return False
+            self.armed = True  # A different sheet, or the same one moved
+
+        # Start a new steady run whenever a corner moves too far
+        if self.run_start is None or _corner_distance(quad, self.run_start[1]) > self.max_motion:
+            self.run_start = (timestamp, quad)
+        if timestamp - self.run_start[0] < self.steady:
+            return False
+
+        # Only measure sharpness once the page has settled
+        self.last_sharpness = quad_sharpness(frame, quad, self.sharpness_scale)
+        if self.last_sharpness < self.min_sharpness:
+            return False
+
+        self.armed = False
+        self.captured_quad = quad
+        self.run_start = None
+        return True
+
+
+def _corner_distance(a, b):
+    # Largest distance between matching corners of two quads
+    return float(np.linalg.norm(order_quad(a) - order_quad(b), axis=1).max())
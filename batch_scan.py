@@ -0,0 +1,200 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from autocapture import AutoCapture
+from pdf_writer import PDFDocument
+from scan_core import (BILEVEL, GLOBAL, GRAYSCALE, METHODS, SAUVOLA, encode_page,
+                       locate_document, quad_sharpness, render_page, scan_page)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.m4v')
+
+# Frames of a video handed to one worker at a time
+VIDEO_CHUNK = 300
+# Seconds of video a worker watches before its chunk starts, so a sheet that
+# was already on the stand at the start of the chunk is not added again
+VIDEO_LEAD = 3.0
+
+
+def scan_image_file(path, options):
+    image = cv2.imread(path)
+    if image is None:
+        return [None]
+    return [scan_page(image, **options)]
+
+
+def scan_video_chunk(path, start, stop, step, options):
+    # One page for every sheet placed under the camera in [start, stop) of
+    # a video, looking at every step-th frame. A sheet is picked up the way
+    # auto capture does in the GUI, once it sits still, and its sharpest
+    # frame while it stays there becomes the page.
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    first = max(start - int(VIDEO_LEAD * fps), 0)
+    first -= first % step  # Same frames as the previous chunk looked at
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    capture = AutoCapture(min_sharpness=0.0)
+    sheets = []  # [sharpness, frame, quad] of the best frame of each sheet
+    sheet = None
+    for index in range(first, stop):
+        if index % step:
+            if not cap.grab():
+                break
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        quad = locate_document(frame, pyramid_scale=options.get('pyramid_scale', 4))
+        if capture.update(index / fps, quad, frame):
+            # Sheets picked up before the chunk belong to the previous one
+            sheet = [capture.last_sharpness, frame, quad] if index >= start else None
+            if sheet is not None:
+                sheets.append(sheet)
+        elif capture.armed:
+            sheet = None  # Taken away or moved; the next capture is a new sheet
+        elif sheet is not None and quad is not None:
+            score = quad_sharpness(frame, quad, capture.sharpness_scale)
+            if score > sheet[0]:
+                sheet[:] = [score, frame, quad]
+    cap.release()
+
+    mode = options.get('mode', BILEVEL)
+    return [encode_page(render_page(frame, quad, binarize=mode == BILEVEL,
+                                    method=options.get('method', GLOBAL)), mode)
+            for _, frame, quad in sheets]
+
+
+def _run_task(task):
+    kind, args = task
+    if kind == 'image':
+        return scan_image_file(*args)
+    return scan_video_chunk(*args)
+
+
+def collect_jobs(inputs, step):
+    # Group the inputs into (name, tasks) jobs: one per image folder and one
+    # per video file. Each job becomes its own PDF (or series of PDFs).
+    jobs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            images = [os.path.join(path, name) for name in names
+                      if name.lower().endswith(IMAGE_EXTENSIONS)]
+            videos = [os.path.join(path, name) for name in names
+                      if name.lower().endswith(VIDEO_EXTENSIONS)]
+            if images:
+                jobs.append((os.path.basename(os.path.normpath(path)),
+                             [('image', (image,)) for image in images]))
+            jobs.extend(video_job(video, step) for video in videos)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            jobs.append(video_job(path, step))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            jobs.append((os.path.splitext(os.path.basename(path))[0], [('image', (path,))]))
+    return jobs
+
+
+def video_job(path, step):
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    tasks = [('video', (path, start, min(start + VIDEO_CHUNK, frame_count), step))
+             for start in range(0, frame_count, VIDEO_CHUNK)]
+    return os.path.splitext(os.path.basename(path))[0], tasks
+
+
+class PdfSplitter:
+    # Writes pages to <name>.pdf, or to <name>_001.pdf, <name>_002.pdf, ...
+    # when every PDF should hold at most pages_per_pdf pages
+    def __init__(self, output_dir, name, pages_per_pdf=0):
+        self.output_dir = output_dir
+        self.name = name
+        self.pages_per_pdf = pages_per_pdf
+        self.pdf = None
+        self.part = 0
+        self.written = []
+
+    def add_page(self, image):
+        if self.pdf is None:
+            self.part += 1
+            self.pdf = PDFDocument(self._filename() + '.part')
+        self.pdf.add_page(image)
+        if self.pages_per_pdf and self.pdf.page_no() >= self.pages_per_pdf:
+            self.close()
+
+    def _filename(self):
+        suffix = f"_{self.part:03d}" if self.pages_per_pdf else ""
+        return os.path.join(self.output_dir, f"{self.name}{suffix}.pdf")
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.output(self._filename())
+            self.written.append(self._filename())
+            self.pdf = None
+
+
+def run(inputs, output_dir, workers=None, pages_per_pdf=0, step=5, options=None):
+    options = options or {}
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = collect_jobs(inputs, step)
+
+    pages = skipped = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Every task of every job is queued up front, one per work item, so
+        # all cores stay busy across short videos and small folders
+        futures = [[executor.submit(_run_task, (kind, args + (options,)))
+                    for kind, args in tasks]
+                   for _, tasks in jobs]
+        for (name, _), job_futures in zip(jobs, futures):
+            splitter = PdfSplitter(output_dir, name, pages_per_pdf)
+            # Results are taken in input order, so pages stay in sequence
+            for future in job_futures:
+                for image in future.result():
+                    if image is None:
+                        skipped += 1
+                    else:
+                        splitter.add_page(image)
+                        pages += 1
+            splitter.close()
+            for filename in splitter.written:
+                print(f"Wrote {filename}")
+
+    elapsed = time.perf_counter() - started
+    rate = pages / elapsed if elapsed > 0 else 0.0
+    print(f"{pages} pages in {elapsed:.1f} s ({rate:.1f} pages/s), "
+          f"{skipped} images without a document skipped")
+    return pages, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scan folders of images and video files into PDFs without the GUI")
+    parser.add_argument('inputs', nargs='+', help="image folders, image files or video files")
+    parser.add_argument('-o', '--output', default='scanned', help="output folder for the PDFs")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument('-n', '--pages-per-pdf', type=int, default=0,
+                        help="split PDFs every N pages (default: one PDF per folder or video)")
+    parser.add_argument('--every', type=int, default=5,
+                        help="look for sheets in every Nth frame of videos (default: 5)")
+    parser.add_argument('--mode', choices=(BILEVEL, GRAYSCALE), default=BILEVEL,
+                        help="page encoding (default: bilevel)")
+    parser.add_argument('--binarize', choices=METHODS, default=SAUVOLA,
+                        help="binarization method for bilevel pages (default: sauvola)")
+    parser.add_argument('--pyramid-scale', type=int, default=4,
+                        help="detect the page at 1/N scale (default: 4, 1 for full size)")
+    parser.add_argument('--keep-undetected', action='store_true',
+                        help="use the whole image when no page outline is found (images only)")
+    args = parser.parse_args(argv)
+
+    options = dict(mode=args.mode, pyramid_scale=args.pyramid_scale,
+                   keep_undetected=args.keep_undetected, method=args.binarize)
+    run(args.inputs, args.output, args.workers, args.pages_per_pdf, max(args.every, 1), options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from binarize import THRESHOLDS, default_window
+from scan_core import (GLOBAL, METHODS, WarpCache, binarize_page, centered_roi, crop_roi,
+                       encode_page, enhance_page, find_document_quad_pyramid, order_quad,
+                       warp_page)
+
+WORDS = ("scanner document page invoice total amount date signature received "
+         "payment account number address member association report summary").split()
+
+FRAME_SIZE = (1920, 1080)
+ROI_SIZE = (1300, 1080)
+PAGE_SIZE = (850, 1100)  # Synthetic A4-ish page, before it is put in the scene
+A4_300DPI = (2480, 3508)  # A full resolution page, for the binarization benchmark
+# Extra warps that compare WarpCache with a plain warp; not part of the pipeline
+CACHE_STAGES = ('warp_preview_miss', 'warp_preview_hit', 'warp_full_miss')
+
+
+def render_text_page(rng, size=PAGE_SIZE):
+    # A white page with a heading and lines of random words
+    width, height = size
+    page = np.full((height, width), 245, np.uint8)
+    cv2.putText(page, ' '.join(rng.choice(WORDS, 3)).upper(), (60, 110),
+                cv2.FONT_HERSHEY_DUPLEX, 1.4, 20, 2)
+    for y in range(180, height - 60, 36):
+        words = ' '.join(rng.choice(WORDS, int(rng.integers(4, 8))))
+        cv2.putText(page, words, (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 30, 2)
+    return cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+
+
+def random_quad(rng, roi, margin=20):
+    # Ground truth corners (tl, tr, br, bl) of a page inside the ROI, with
+    # random scale, rotation and perspective
+    x1, y1, x2, y2 = roi
+    while True:
+        height = rng.uniform(0.55, 0.85) * (y2 - y1)
+        width = height * PAGE_SIZE[0] / PAGE_SIZE[1]
+        corners = np.array([[-width, -height], [width, -height], [width, height],
+                            [-width, height]]) / 2
+        angle = np.deg2rad(rng.uniform(-12, 12))
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        corners = corners @ rotation.T + rng.normal(0, 0.03 * width, (4, 2))
+        center = ((x1 + x2) / 2 + rng.uniform(-0.1, 0.1) * (x2 - x1),
+                  (y1 + y2) / 2 + rng.uniform(-0.05, 0.05) * (y2 - y1))
+        quad = (corners + center).astype(np.float32)
+        # The whole page has to be in view for the ground truth to be fair
+        if (quad.min(axis=0) >= (x1 + margin, y1 + margin)).all() and \
+                (quad.max(axis=0) <= (x2 - margin, y2 - margin)).all():
+            return quad
+
+
+def render_scene(rng, roi, frame_size=FRAME_SIZE):
+    # A camera frame with the page on a dark desk under uneven light and noise
+    width, height = frame_size
+    page = render_text_page(rng)
+    quad = random_quad(rng, roi)
+    source = np.array([[0, 0], [PAGE_SIZE[0] - 1, 0], [PAGE_SIZE[0] - 1, PAGE_SIZE[1] - 1],
+                       [0, PAGE_SIZE[1] - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(source, quad)
+
+    desk = rng.uniform(25, 80)
+    frame = np.full((height, width, 3), desk, np.float32)
+    warped = cv2.warpPerspective(page, matrix, frame_size).astype(np.float32)
+    mask = cv2.warpPerspective(np.full(PAGE_SIZE[::-1], 1, np.float32), matrix, frame_size)
+    frame = frame * (1 - mask[..., None]) + warped * mask[..., None]
+
+    # Light falls off across the stand in a random direction
+    direction = rng.normal(size=2)
+    direction /= np.linalg.norm(direction)
+    xs, ys = np.meshgrid(np.linspace(-1, 1, width), np.linspace(-1, 1, height))
+    light = 1 - rng.uniform(0.1, 0.35) * (0.5 + 0.5 * (xs * direction[0] + ys * direction[1]))
+    frame *= light[..., None].astype(np.float32)
+    frame += rng.standard_normal(frame.shape, dtype=np.float32) * rng.uniform(2, 8)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    if rng.random() < 0.5:
+        frame = cv2.GaussianBlur(frame, (3, 3), 0)
+    return frame, quad
+
+
+def corner_error(found, truth):
+    # Mean and max distance between matching corners, in pixels
+    distances = np.linalg.norm(order_quad(found) - order_quad(truth), axis=1)
+    return float(distances.mean()), float(distances.max())
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {'p50': float(np.percentile(values, 50)), 'p95': float(np.percentile(values, 95)),
+            'p99': float(np.percentile(values, 99)), 'mean': float(values.mean())}
+
+
+class Stages:
+    # Runs the GUI's page pipeline one stage at a time so each can be timed
+    def __init__(self, roi, pyramid_scale, preview_size=(600, 800), method=GLOBAL):
+        self.roi = roi
+        self.pyramid_scale = pyramid_scale
+        self.preview_size = preview_size
+        self.method = method
+
+    def run(self, frame, measure):
+        roi_image, offset = crop_roi(frame, self.roi)
+        quad = measure('detect', find_document_quad_pyramid, roi_image, self.pyramid_scale)
+        if quad is None:
+            return None
+        quad = quad + np.array(offset)
+        warped = measure('warp_preview', warp_page, frame, quad, self.preview_size)
+        # The detector reuses remap tables while a page sits still: the first
+        # frame of a new quad builds them, the following frames only remap
+        cache = WarpCache()
+        measure('warp_preview_miss', warp_page, frame, quad, self.preview_size, cache)
+        measure('warp_preview_hit', warp_page, frame, quad, self.preview_size, cache)
+        measure('binarize_preview', enhance_page, warped, True, self.method)
+        warped = measure('warp_full', warp_page, frame, quad)
+        # A full page is warped once per sheet, so with a cache it always misses
+        measure('warp_full_miss', warp_page, frame, quad, None, WarpCache())
+        page = measure('binarize_full', enhance_page, warped, True, self.method)
+        measure('encode', encode_page, page)
+        return quad
+
+
+def timed(results):
+    def measure(stage, function, *args):
+        started = time.perf_counter()
+        value = function(*args)
+        results.setdefault(stage, []).append(time.perf_counter() - started)
+        return value
+    return measure
+
+
+def allocated(results):
+    # Peak Python/numpy memory allocated while a stage runs
+    def measure(stage, function, *args):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        value = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        results.setdefault(stage, []).append(peak - before)
+        return value
+    return measure
+
+
+def run(frames=100, seed=0, pyramid_scale=4, warmup=5, method=GLOBAL):
+    rng = np.random.default_rng(seed)
+    roi = centered_roi(*FRAME_SIZE, *ROI_SIZE)
+    scenes = [render_scene(rng, roi) for _ in range(frames + warmup)]
+    stages = Stages(roi, pyramid_scale, method=method)
+
+    for frame, _ in scenes[:warmup]:
+        stages.run(frame, timed({}))
+
+    timings, errors, missed = {}, [], 0
+    started = time.perf_counter()
+    for frame, truth in scenes[warmup:]:
+        quad = stages.run(frame, timed(timings))
+        if quad is None:
+            missed += 1
+        else:
+            errors.append(corner_error(quad, truth))
+    elapsed = time.perf_counter() - started
+    elapsed -= sum(sum(timings.get(stage, ())) for stage in CACHE_STAGES)
+
+    allocations = {}
+    tracemalloc.start()
+    for frame, _ in scenes[warmup:warmup + min(frames, 20)]:
+        stages.run(frame, allocated(allocations))
+    tracemalloc.stop()
+
+    mean_errors = [mean for mean, _ in errors]
+    return {
+        'frames': frames,
+        'pyramid_scale': pyramid_scale,
+        'method': method,
+        'frames_per_second': frames / elapsed,
+        'stages': {stage: dict(percentiles(samples),
+                               alloc_mb=float(np.mean(allocations.get(stage, [0]))) / 2 ** 20)
+                   for stage, samples in timings.items()},
+        'detected': frames - missed,
+        'corner_error_px': {
+            'mean': float(np.mean(mean_errors)) if errors else None,
+            'p95': float(np.percentile(mean_errors, 95)) if errors else None,
+            'max': max(worst for _, worst in errors) if errors else None,
+        },
+    }
+
+
+def print_report(report):
+    print(f"{report['frames']} frames at {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, "
+          f"pyramid scale {report['pyramid_scale']}, {report['method']} binarization: "
+          f"{report['frames_per_second']:.1f} frames/s end to end")
+    print(f"{'stage':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'alloc MB':>10}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<18}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}"
+              f"{stats['alloc_mb']:>10.2f}")
+    errors = report['corner_error_px']
+    print(f"detected {report['detected']}/{report['frames']} pages", end='')
+    if errors['mean'] is not None:
+        print(f", corner error mean {errors['mean']:.2f} px, p95 {errors['p95']:.2f} px, "
+              f"max {errors['max']:.2f} px")
+    else:
+        print()
+
+
+def lit_page(rng, size=A4_300DPI):
+    # A grayscale page at full scanning resolution under strong uneven light
+    # with sensor noise, and the ink mask of the same page evenly lit
+    clean = cv2.resize(render_text_page(rng), size, interpolation=cv2.INTER_CUBIC)
+    clean = cv2.cvtColor(clean, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    direction = rng.normal(size=2)
+    direction /= np.linalg.norm(direction)
+    xs, ys = np.meshgrid(np.linspace(-1, 1, size[0], dtype=np.float32),
+                         np.linspace(-1, 1, size[1], dtype=np.float32))
+    light = 1 - 0.6 * (0.5 + 0.5 * (xs * direction[0] + ys * direction[1]))
+    page = clean * light * 0.9 + 15 + rng.standard_normal(clean.shape, dtype=np.float32) * 6
+    return np.clip(page, 0, 255).astype(np.uint8), clean < 128
+
+
+def run_binarization(size=A4_300DPI, windows=(None, 31, 101, 301), repeats=5, seed=0):
+    # Latency and accuracy of every binarization method on one page. The
+    # local methods are timed at several window sizes to show their cost
+    # does not depend on it.
+    rng = np.random.default_rng(seed)
+    page, ink = lit_page(rng, size)
+    results = []
+    for method in METHODS:
+        for window in windows if method in THRESHOLDS else (None,):
+            binarize_page(page, method, window)  # Warm up
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                binary = binarize_page(page, method, window)
+                samples.append(time.perf_counter() - started)
+            if method in THRESHOLDS:
+                window = window or default_window(page)
+            results.append(dict(percentiles(samples), method=method, window=window,
+                                error_pct=float(((binary == 0) != ink).mean() * 100)))
+    return {'size': list(size), 'repeats': repeats, 'results': results}
+
+
+def print_binarization_report(report):
+    width, height = report['size']
+    print(f"Binarization of a {width}x{height} page (A4 at 300 dpi) under uneven light, "
+          f"{report['repeats']} runs each")
+    print(f"{'method':<10}{'window':>8}{'p50 ms':>9}{'p95 ms':>9}{'wrong %':>9}")
+    for result in report['results']:
+        window = result['window'] or '-'
+        print(f"{result['method']:<10}{window:>8}{result['p50']:>9.1f}{result['p95']:>9.1f}"
+              f"{result['error_pct']:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the detection and page pipeline on synthetic documents")
+    parser.add_argument('-n', '--frames', type=int, default=100, help="frames to time")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the scenes")
+    parser.add_argument('--pyramid-scale', type=int, nargs='+', default=[1, 4],
+                        help="detection scales to compare (default: 1 4)")
+    parser.add_argument('--method', choices=METHODS, default=GLOBAL,
+                        help="binarization method for the page stages (default: global)")
+    parser.add_argument('--binarization', action='store_true',
+                        help="compare the binarization methods on a 300 dpi page instead")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.binarization:
+        reports = run_binarization(seed=args.seed)
+        print_binarization_report(reports)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(reports, f, indent=2)
+        return
+
+    reports = []
+    for scale in args.pyramid_scale:
+        report = run(args.frames, args.seed, scale, method=args.method)
+        print_report(report)
+        print()
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+# Binarization methods. GLOBAL is the fixed threshold the scanner always
+# used; the others threshold each pixel against its neighbourhood, so
+# uneven light across the stand neither washes out nor blackens the page.
+GLOBAL = 'global'
+OTSU = 'otsu'
+SAUVOLA = 'sauvola'
+WOLF = 'wolf'
+BRADLEY = 'bradley'
+METHODS = (GLOBAL, OTSU, SAUVOLA, WOLF, BRADLEY)
+
+
+def default_window(gray):
+    # About 1/40 of the short side: 63 px on an A4 page at 300 dpi, wide
+    # enough to span a few lines of text. Always odd.
+    return max(int(min(gray.shape[:2]) / 40), 7) | 1
+
+
+def local_stats(gray, window, need_std=True):
+    # Mean and standard deviation over a window x window neighbourhood of
+    # every pixel. Box filters keep running sums, so the cost per pixel is
+    # the same for any window size. The arithmetic is done in place with
+    # OpenCV, since numpy temporaries of a 300 dpi page cost more than the
+    # filters themselves.
+    ksize = (window, window)
+    mean = cv2.boxFilter(gray, cv2.CV_32F, ksize, borderType=cv2.BORDER_REFLECT)
+    if not need_std:
+        return mean, None
+    std = cv2.sqrBoxFilter(gray, cv2.CV_32F, ksize, borderType=cv2.BORDER_REFLECT)
+    cv2.subtract(std, cv2.multiply(mean, mean), dst=std)
+    cv2.max(std, 0, dst=std)
+    cv2.sqrt(std, dst=std)
+    return mean, std
+
+
+def sauvola_threshold(gray, window, k=0.2, r=128.0):
+    # T = m * (1 + k * (s / R - 1)) = (1 - k) * m + (k / R) * m * s
+    mean, std = local_stats(gray, window)
+    cv2.multiply(mean, std, dst=std, scale=k / r)
+    return cv2.scaleAdd(mean, 1 - k, std, dst=std)
+
+
+def wolf_threshold(gray, window, k=0.5):
+    # Wolf & Jolion: Sauvola normalized by the page's own contrast, which
+    # copes better with dim, low-contrast pages.
+    # T = (1 - k) * m + k * M + k * (s / R) * (m - M)
+    mean, std = local_stats(gray, window)
+    darkest = float(gray.min())
+    r = max(float(std.max()), 1e-6)
+    contrast = cv2.subtract(mean, darkest)
+    cv2.multiply(contrast, std, dst=std, scale=k / r)
+    cv2.scaleAdd(mean, 1 - k, std, dst=std)
+    return cv2.add(std, k * darkest, dst=std)
+
+
+def bradley_threshold(gray, window, k=0.15):
+    # Bradley & Roth: a pixel is ink when it is a fraction k darker than
+    # its neighbourhood mean
+    mean, _ = local_stats(gray, window, need_std=False)
+    return cv2.multiply(mean, 1 - k, dst=mean)
+
+
+THRESHOLDS = {SAUVOLA: sauvola_threshold, WOLF: wolf_threshold, BRADLEY: bradley_threshold}
+
+
+def binarize_page(gray, method=GLOBAL, window=None, k=None):
+    # Black text (0) on white (255) from an 8-bit grayscale page
+    if method == GLOBAL:
+        _, page = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY)
+        return page
+    if method == OTSU:
+        _, page = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return page
+
+    if method not in THRESHOLDS:
+        raise ValueError(f"Unknown binarization method: {method}")
+    window = window or default_window(gray)
+    if k is None:
+        threshold = THRESHOLDS[method](gray, window)
+    else:
+        threshold = THRESHOLDS[method](gray, window, k)
+    return cv2.compare(gray.astype(np.float32), threshold, cv2.CMP_GT)
@@ -0,0 +1,144 @@
+import logging
+import threading
+from collections import namedtuple
+
+import cv2
+
+from capture import FrameGrabber
+
+logger = logging.getLogger('scanner.cameras')
+
+# A working camera and the mode it actually delivers at the requested size
+CameraInfo = namedtuple('CameraInfo', ['index', 'width', 'height', 'fps'])
+
+
+def probe_camera(index, width, height, backend=cv2.CAP_DSHOW):
+    # Open a camera just long enough to read one frame; None if there is
+    # no working camera at this index
+    cap = cv2.VideoCapture(index, backend)
+    try:
+        if not cap.isOpened():
+            return None
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        ret, _ = cap.read()
+        if not ret:
+            return None
+        return CameraInfo(index, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                          int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), cap.get(cv2.CAP_PROP_FPS))
+    finally:
+        cap.release()
+
+
+class CameraPool:
+    # Owns every open camera. Devices are enumerated once, on a background
+    # thread that waits for the active camera to open first. Up to keep_open
+    # cameras stay open: the active one decodes frames, the others idle
+    # (grabbing without decoding), so switching between them is instant.
+    # Cameras beyond keep_open are released on a background thread, never
+    # on the Tk loop.
+    def __init__(self, width, height, backend=cv2.CAP_DSHOW, keep_open=2, max_cameras=6,
+                 metrics=None):
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.keep_open = max(keep_open, 1)
+        self.max_cameras = max_cameras
+        self.metrics = metrics
+
+        self.devices = None  # CameraInfo for each working camera, once enumerated
+        self.active_index = None
+        self.grabbers = {}
+        self._recent = []  # Open camera indices, most recently used first
+        self._lock = threading.Lock()
+        self._enumerate_thread = None
+
+    def activate(self, index):
+        # Make camera `index` the one that decodes frames and return its grabber
+        with self._lock:
+            grabber = self.grabbers.get(index)
+            if grabber is None or not grabber.is_running():
+                grabber = FrameGrabber(index, self.width, self.height, self.backend).start()
+                self.grabbers[index] = grabber
+            for other_index, other in self.grabbers.items():
+                if other_index != index:
+                    other.metrics = None
+                    other.set_active(False)
+            grabber.metrics = self.metrics
+            grabber.set_active(True)
+            self.active_index = index
+            self._use(index)
+            self._release_extra()
+        return grabber
+
+    def enumerate(self):
+        # Find the working cameras in the background; returns immediately
+        if self._enumerate_thread is None:
+            self._enumerate_thread = threading.Thread(target=self._enumerate, daemon=True)
+            self._enumerate_thread.start()
+        return self
+
+    def _enumerate(self):
+        active = self.grabbers.get(self.active_index)
+        if active is not None:
+            active.wait_opened(5.0)  # Never compete with the camera on screen
+
+        devices = []
+        for index in range(self.max_cameras):
+            with self._lock:
+                grabber = self.grabbers.get(index)
+            if grabber is not None:
+                grabber.wait_opened(5.0)
+                if grabber.is_opened() and grabber.mode is not None:
+                    devices.append(CameraInfo(index, *grabber.mode))
+                continue
+            info = probe_camera(index, self.width, self.height, self.backend)
+            if info is not None:
+                devices.append(info)
+        self.devices = devices
+        logger.info("Cameras: %s", ", ".join(
+            f"{info.index} ({info.width}x{info.height} @ {info.fps:.0f} fps)" for info in devices)
+            or "none")
+
+        # Warm the rest of the set, so the first switch is instant too
+        with self._lock:
+            for info in devices:
+                if len(self.grabbers) >= self.keep_open:
+                    break
+                if info.index not in self.grabbers:
+                    self.grabbers[info.index] = FrameGrabber(
+                        info.index, self.width, self.height, self.backend, active=False).start()
+                    self._recent.append(info.index)
+
+    def indices(self):
+        # Camera indices to cycle through; before enumeration has finished,
+        # the first two indices as the scanner always assumed
+        if self.devices:
+            return [info.index for info in self.devices]
+        return [0, 1]
+
+    def next_index(self, current):
+        indices = self.indices()
+        if current not in indices:
+            return indices[0]
+        return indices[(indices.index(current) + 1) % len(indices)]
+
+    def _use(self, index):
+        if index in self._recent:
+            self._recent.remove(index)
+        self._recent.insert(0, index)
+
+    def _release_extra(self):
+        for index in self._recent[self.keep_open:]:
+            grabber = self.grabbers.pop(index, None)
+            if grabber is not None:
+                threading.Thread(target=grabber.stop, daemon=True).start()
+        del self._recent[self.keep_open:]
+
+    def stop(self):
+        with self._lock:
+            grabbers = list(self.grabbers.values())
+            self.grabbers.clear()
+            self._recent.clear()
+        for grabber in grabbers:
+            grabber.stop()
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# A captured camera frame together with its sequence number and capture time
+Frame = namedtuple('Frame', ['image', 'seq', 'timestamp'])
+
+
+class FrameGrabber:
+    # Reads the camera on its own thread and keeps only the newest frame, so a
+    # slow consumer never makes frames pile up in the driver
+    def __init__(self, camera_index, width, height, backend=cv2.CAP_DSHOW, metrics=None,
+                 active=True):
+        self.camera_index = camera_index
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.metrics = metrics
+        # An inactive grabber keeps the camera open and its driver queue
+        # drained, but only grabs frames without decoding them
+        self.active = active
+        self.mode = None  # (width, height, fps) the camera actually delivers
+
+        self.cap = None
+        self.latest = None
+        self.captured = 0  # Frames read from the camera
+        self.dropped = 0   # Frames replaced before anyone consumed them
+        self._consumed_seq = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._opened_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.camera_index, self.backend)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        return cap
+
+    def _run(self):
+        self.cap = self._open()
+        if self.cap.isOpened():
+            self.mode = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                         self.cap.get(cv2.CAP_PROP_FPS))
+        self._opened_event.set()
+        try:
+            while not self._stop_event.is_set() and self.cap.isOpened():
+                if not self.active:
+                    if not self.cap.grab():
+                        time.sleep(0.01)
+                    continue
+
+                started = time.perf_counter()
+                ret, image = self.cap.read()
+                if self.metrics is not None:
+                    self.metrics.record('capture', time.perf_counter() - started)
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+
+                with self._condition:
+                    if not self.active:
+                        continue  # Went idle while this frame was being read
+                    self.captured += 1
+                    dropped = self.latest is not None and self.latest.seq > self._consumed_seq
+                    if dropped:
+                        self.dropped += 1
+                    self.latest = Frame(image, self.captured, time.monotonic())
+                    self._condition.notify_all()
+                if self.metrics is not None:
+                    # Totals over every camera that was active, for the overlay and export
+                    self.metrics.count('frames')
+                    if dropped:
+                        self.metrics.count('dropped')
+        finally:
+            self.cap.release()
+            with self._condition:
+                self._condition.notify_all()
+
+    def set_active(self, active):
+        # Going idle drops the last frame, so nobody picks up a stale one
+        # when the camera is made active again
+        with self._condition:
+            self.active = active
+            if not active:
+                self.latest = None
+            self._condition.notify_all()
+
+    def wait_opened(self, timeout=None):
+        return self._opened_event.wait(timeout)
+
+    def is_opened(self):
+        return self._opened_event.is_set() and self.cap is not None and self.cap.isOpened()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def read(self, after_seq=0):
+        # Return the newest frame if it is newer than after_seq, else None.
+        # Never blocks on the camera.
+        with self._condition:
+            frame = self.latest
+            if frame is None or frame.seq <= after_seq:
+                return None
+            self._consumed_seq = max(self._consumed_seq, frame.seq)
+            return frame
+
+    def wait(self, after_seq=0, timeout=None):
+        # Block until a frame newer than after_seq is available. Meant for
+        # worker threads, never for the Tk loop.
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self.latest is not None and self.latest.seq > after_seq)
+                or self._stop_event.is_set() or not self.is_running(),
+                timeout)
+        return self.read(after_seq)
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+from pages import page_size, warp_page
+
+MEAN = 'mean'
+MEDIAN = 'median'
+
+
+def phase_shift(reference, image, window=None):
+    # Sub-pixel (dx, dy) that moves image onto reference, and the
+    # correlation response (close to 1 for a clean match)
+    (dx, dy), response = cv2.phaseCorrelate(reference, image, window)
+    return -dx, -dy, response
+
+
+def align_pages(frames, quads, size=None, refine=True, min_response=0.1):
+    # Warp every frame by its own quad to the same page size. The quads
+    # already align the pages to within a pixel or so; with refine, what is
+    # left is measured by phase correlation against the first page and
+    # removed with a sub-pixel shift.
+    if size is None:
+        size = page_size(quads[0])
+    pages = [warp_page(frame, quad, size) for frame, quad in zip(frames, quads)]
+    if not refine or len(pages) < 2:
+        return pages
+
+    def gray(page):
+        return cv2.cvtColor(page, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    reference = gray(pages[0])
+    window = cv2.createHanningWindow(size, cv2.CV_32F)
+    aligned = [pages[0]]
+    for page in pages[1:]:
+        dx, dy, response = phase_shift(reference, gray(page), window)
+        # A weak response means the match is unreliable; trust the quad then
+        if response >= min_response and (abs(dx) > 0.05 or abs(dy) > 0.05) \
+                and abs(dx) < 8 and abs(dy) < 8:
+            shift = np.float32([[1, 0, dx], [0, 1, dy]])
+            page = cv2.warpAffine(page, shift, size, flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_REPLICATE)
+        aligned.append(page)
+    return aligned
+
+
+def fuse_pages(pages, method=MEDIAN):
+    # Combine aligned pages pixel by pixel. The median also rejects a hand or
+    # a glint that is only in some of the frames; the mean removes slightly
+    # more noise.
+    if len(pages) == 1:
+        return pages[0]
+    stack = np.stack(pages)
+    if method == MEDIAN:
+        return np.median(stack, axis=0).astype(np.uint8)
+    return (stack.mean(axis=0, dtype=np.float32) + 0.5).astype(np.uint8)
+
+
+def denoise_page(frames, quads, size=None, method=MEDIAN, refine=True):
+    # Flattened, fused page (BGR, not yet enhanced) from several frames of
+    # the same sheet. The first frame is the reference, so pass the
+    # sharpest one first.
+    return fuse_pages(align_pages(frames, quads, size, refine), method)
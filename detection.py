@@ -0,0 +1,388 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from metrics import Metrics
+from binarize import GLOBAL
+from pages import WarpCache, order_quad, quad_sharpness, render_page
+
+logger = logging.getLogger('scanner.detection')
+
+# Result of running the detector on one captured frame. quad is None when no
+# document was found. page is a preview-sized rendering of the document, only
+# produced at a throttled rate; the full resolution page is rendered from
+# frame and quad when it is actually needed. source tells whether the quad
+# came from a full detection or from tracking.
+Detection = namedtuple('Detection', ['seq', 'timestamp', 'frame', 'quad', 'page', 'source'])
+
+DETECTED = 'detected'
+TRACKED = 'tracked'
+
+# A recent frame with a page in it, kept so "Add page" can use the sharpest
+Candidate = namedtuple('Candidate', ['timestamp', 'frame', 'quad', 'sharpness'])
+
+
+def centered_roi(width, height, roi_width, roi_height):
+    # Region of interest centered in a width x height frame
+    x1 = (width - roi_width) // 2
+    y1 = (height - roi_height) // 2
+    return x1, y1, x1 + roi_width, y1 + roi_height
+
+
+def scale_roi(roi, width, height):
+    # Pixel (x1, y1, x2, y2) of a region given as fractions of the frame, so
+    # the same setting works for any camera mode
+    fx1, fy1, fx2, fy2 = roi
+    x1, x2 = int(round(fx1 * width)), int(round(fx2 * width))
+    y1, y2 = int(round(fy1 * height)), int(round(fy2 * height))
+    return max(x1, 0), max(y1, 0), min(max(x2, x1 + 1), width), min(max(y2, y1 + 1), height)
+
+
+def search_window(quad, bounds, margin=0.25, min_pad=24):
+    # Bounding box of the quad grown by margin times its size (and at least
+    # min_pad pixels, so corner refinement has room), clipped to bounds
+    x, y, w, h = cv2.boundingRect(np.asarray(quad, dtype=np.float32).reshape(-1, 1, 2))
+    pad_x = max(int(w * margin), min_pad)
+    pad_y = max(int(h * margin), min_pad)
+    bx1, by1, bx2, by2 = bounds
+    return (max(x - pad_x, bx1), max(y - pad_y, by1),
+            min(x + w + pad_x, bx2), min(y + h + pad_y, by2))
+
+
+def quad_area(quad):
+    return cv2.contourArea(np.asarray(quad, dtype=np.float32).reshape(-1, 1, 2))
+
+
+def find_document_quad(roi_image, min_area=1000):
+    # Return the four corners of the largest 4-sided contour, or None
+    gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, threshold = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    contours, _ = cv2.findContours(threshold, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)
+
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area <= min_area:
+            break  # Sorted by area, so nothing after this is big enough
+        peri = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.015 * peri, True)
+        if len(approx) == 4:
+            return approx.reshape(4, 2)
+    return None
+
+
+def refine_corners(roi_image, quad, window):
+    # Snap each corner to sub-pixel accuracy using only a small full
+    # resolution patch around it, instead of the whole ROI
+    height, width = roi_image.shape[:2]
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+    half = window * 3
+    refined = quad.astype(np.float32)
+
+    for i, (x, y) in enumerate(refined):
+        px1, py1 = max(int(x) - half, 0), max(int(y) - half, 0)
+        px2, py2 = min(int(x) + half + 1, width), min(int(y) + half + 1, height)
+        if px2 - px1 <= 2 * window + 5 or py2 - py1 <= 2 * window + 5:
+            continue  # Too close to the border for the search window
+        patch = cv2.cvtColor(roi_image[py1:py2, px1:px2], cv2.COLOR_BGR2GRAY)
+        corner = np.array([[[x - px1, y - py1]]], dtype=np.float32)
+        cv2.cornerSubPix(patch, corner, (window, window), (-1, -1), criteria)
+        cx, cy = corner[0, 0] + (px1, py1)
+        # Keep the coarse corner if refinement wandered off
+        if abs(cx - x) <= window and abs(cy - y) <= window:
+            refined[i] = (cx, cy)
+    return refined
+
+
+def find_document_quad_pyramid(roi_image, scale=4, min_area=1000):
+    # Coarse-to-fine detection: find the quad on a 1/scale image, then
+    # refine its corners at full resolution
+    if scale <= 1:
+        return find_document_quad(roi_image, min_area)
+
+    small = cv2.resize(roi_image, None, fx=1.0 / scale, fy=1.0 / scale,
+                       interpolation=cv2.INTER_AREA)
+    quad = find_document_quad(small, min_area / (scale * scale))
+    if quad is None:
+        return None
+    return refine_corners(roi_image, quad * scale, window=3 * scale)
+
+
+class QuadTracker:
+    # Follows the last accepted quad between frames with sparse optical flow,
+    # so the full detector only has to run when tracking becomes unreliable
+    # or every redetect_interval frames
+    def __init__(self, redetect_interval=15, max_error=1.0, max_area_change=0.15):
+        self.redetect_interval = redetect_interval
+        self.max_error = max_error  # Forward-backward error in pixels
+        self.max_area_change = max_area_change
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3,
+                              criteria=(cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.reset()
+
+    def reset(self):
+        self.quad = None
+        self.prev_gray = None
+        self.frames_tracked = 0
+
+    def needs_detection(self):
+        return self.quad is None or self.frames_tracked >= self.redetect_interval
+
+    def accept(self, gray, quad):
+        # Start following a freshly detected quad (None stops tracking)
+        self.quad = None if quad is None else quad.astype(np.float32)
+        self.prev_gray = gray
+        self.frames_tracked = 0
+
+    def track(self, gray):
+        # Return the quad moved into this frame, or None when confidence is low
+        points = self.quad.reshape(-1, 1, 2)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None,
+                                                    **self.lk_params)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, moved, None,
+                                                        **self.lk_params)
+        error = np.linalg.norm((back - points).reshape(-1, 2), axis=1)
+        quad = moved.reshape(4, 2)
+
+        if not (status.all() and back_status.all() and (error <= self.max_error).all()
+                and self._plausible(quad)):
+            self.reset()
+            return None
+
+        self.quad = quad
+        self.prev_gray = gray
+        self.frames_tracked += 1
+        return quad
+
+    def _plausible(self, quad):
+        # Tracked corners must still form a convex quad of about the same size
+        contour = quad.reshape(-1, 1, 2)
+        if not cv2.isContourConvex(contour):
+            return False
+        old_area = cv2.contourArea(self.quad.reshape(-1, 1, 2))
+        return old_area > 0 and abs(cv2.contourArea(contour) / old_area - 1) <= self.max_area_change
+
+
+class DetectionWorker:
+    # Runs document detection and page processing on a background thread.
+    # Always works on the newest captured frame, skipping any it fell behind
+    # on, and keeps only the newest result for the UI to pick up.
+    def __init__(self, source, roi, normalize=False, pyramid_scale=1, redetect_interval=0,
+                 preview_size=(600, 800), preview_interval=0.1, burst_size=0, metrics=None,
+                 binarize=True, binarize_method=GLOBAL, search_margin=None):
+        self.source = source
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.roi = roi  # (x1, y1, x2, y2) as fractions of the frame
+        # Once a page is found, search only around it, grown by this fraction
+        # of its size; None always searches the whole ROI
+        self.search_margin = search_margin
+        self.window = None  # Current search window in pixels, None for the whole ROI
+        self._window_area = None  # Area of the page the window was put around
+        self._frame_roi = None  # (frame shape, pixel ROI) for the last frame size
+        self.normalize = normalize
+        self.preview_size = preview_size  # (width, height) of the rendered preview page
+        self.preview_interval = preview_interval  # Minimum seconds between previews
+        # Same as the saved pages, so the preview matches: bi-level pages or,
+        # without binarize, grayscale photos
+        self.binarize = binarize
+        self.binarize_method = binarize_method
+        self._last_preview = 0.0
+        self.warp_cache = WarpCache()
+        self.pyramid_scale = pyramid_scale  # 1 detects at full resolution
+        # Track the quad between full detections; 0 detects on every frame
+        self.tracker = QuadTracker(redetect_interval) if redetect_interval > 0 else None
+        # Ring buffer of scored candidates; each holds a full frame, so keep
+        # it to a few hundred milliseconds of video. 0 turns it off.
+        self.candidates = deque(maxlen=burst_size) if burst_size > 0 else None
+
+        self.latest = None
+        self.processed = 0
+        self.detected = 0
+        self.tracked = 0
+        self._tracker_source = None
+        self._source_seq = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def set_source(self, source):
+        # Used when the camera is switched; sequence numbers restart
+        with self._lock:
+            self.source = source
+            self._source_seq = 0
+            self.latest = None
+            if self.candidates is not None:
+                self.candidates.clear()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            source = self.source
+            frame = source.wait(self._source_seq, timeout=0.1)
+            if frame is None:
+                self._stop_event.wait(0.01)
+                continue
+
+            if source is not self._tracker_source:
+                self.reset_tracking()  # Never track across a camera switch
+                self._tracker_source = source
+
+            try:
+                detection = self.process(frame)
+            except Exception:
+                # Never let one bad frame end the worker; start over on the next
+                logger.exception("Detection failed on frame %d", frame.seq)
+                self.reset_tracking()
+                with self._lock:
+                    if source is self.source:
+                        self._source_seq = frame.seq
+                continue
+
+            with self._lock:
+                if source is not self.source:
+                    continue  # Camera was switched while we were busy
+                self._source_seq = frame.seq
+                self.processed += 1
+                self.latest = detection
+
+    def process(self, frame):
+        image = frame.image
+        if self.normalize:
+            image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX)
+
+        with self.metrics.stage('locate'):
+            quad, source = self.locate(image, self.frame_roi(image))
+        page = None
+        if quad is not None:
+            if self.candidates is not None:
+                with self.metrics.stage('sharpness'):
+                    score = quad_sharpness(image, quad)
+                self.candidates.append(Candidate(frame.timestamp, image, quad, score))
+            now = time.monotonic()
+            if now - self._last_preview >= self.preview_interval:
+                self._last_preview = now
+                with self.metrics.stage('preview_render'):
+                    page = render_page(image, quad, self.preview_size, self.warp_cache,
+                                       self.binarize, self.binarize_method)
+        return Detection(frame.seq, frame.timestamp, image, quad, page, source)
+
+    def reset_tracking(self):
+        # Forget where the page was: stop tracking and search the whole ROI
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.window = None
+
+    def frame_roi(self, image):
+        # The configured ROI in pixels for this frame's actual size. A new
+        # size means a new camera mode, so nothing from the old one applies.
+        shape = image.shape[:2]
+        if self._frame_roi is None or self._frame_roi[0] != shape:
+            self._frame_roi = (shape, scale_roi(self.roi, shape[1], shape[0]))
+            self.reset_tracking()
+            with self._lock:
+                if self.candidates is not None:
+                    self.candidates.clear()
+        return self._frame_roi[1]
+
+    def edge_tolerance(self):
+        # How far inside the search window the corner of a page cut off by
+        # the window can end up: a couple of pixels at detection scale, plus
+        # as far as corner refinement may move it
+        scale = max(self.pyramid_scale, 1)
+        return 2 * scale + (3 * scale if scale > 1 else 0) + 2
+
+    def locate(self, image, roi):
+        # Find the quad in frame coordinates, tracking it when possible. The
+        # tracker works inside the search window it was started in; the
+        # window only moves on a full detection.
+        region = self.window or roi
+        if self.tracker is not None and not self.tracker.needs_detection():
+            x1, y1, x2, y2 = region
+            quad = self.tracker.track(cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY))
+            if quad is not None:
+                self.tracked += 1
+                return quad + np.array([x1, y1]), TRACKED
+
+        # The window is only a fast first try to pick the page up again after
+        # tracking lost it. The periodic redetect (tracking was fine) and
+        # detection without a tracker search the whole ROI, so a new sheet
+        # reaching past the window is never mistaken for the old one.
+        if self.tracker is None or self.tracker.quad is not None:
+            region = roi
+        quad = self._detect(image, region, roi)
+        if quad is None and region != roi:
+            quad = self._detect(image, roi, roi)  # Lost it in the window: try the whole ROI
+        self.detected += 1
+
+        if self.search_margin is not None:
+            self.window = None if quad is None else search_window(
+                quad, roi, self.search_margin, min_pad=2 * self.edge_tolerance())
+            self._window_area = None if quad is None else quad_area(quad)
+        if self.tracker is not None:
+            x1, y1, x2, y2 = self.window or roi
+            gray = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+            self.tracker.accept(gray, None if quad is None else quad - np.array([x1, y1]))
+        return quad, DETECTED
+
+    def _detect(self, image, region, roi):
+        # Full detection in a region of the ROI; the quad comes back in frame
+        # coordinates. In the search window only the page it was put around
+        # counts: a quad with a corner near an edge of the window that is not
+        # an edge of the ROI is probably a bigger sheet cut off by the window,
+        # and one of a very different size is something on a new sheet.
+        x1, y1, x2, y2 = region
+        quad = find_document_quad_pyramid(image[y1:y2, x1:x2], self.pyramid_scale)
+        if quad is None:
+            return None
+        quad = quad + np.array([x1, y1])
+        if region != roi:
+            rx1, ry1, rx2, ry2 = roi
+            tolerance = self.edge_tolerance()
+            xs, ys = quad[:, 0], quad[:, 1]
+            if ((x1 > rx1 and (xs < x1 + tolerance).any())
+                    or (y1 > ry1 and (ys < y1 + tolerance).any())
+                    or (x2 < rx2 and (xs > x2 - 1 - tolerance).any())
+                    or (y2 < ry2 and (ys > y2 - 1 - tolerance).any())):
+                return None
+            if not 0.5 <= quad_area(quad) / self._window_area <= 2.0:
+                return None
+        return quad
+
+    def recent_candidates(self, window=0.4, max_shift=20.0):
+        # Frames from the last `window` seconds that show the page where it
+        # is now (no corner more than max_shift pixels away), so a sheet
+        # that was just replaced is never picked. Sharpest first.
+        if not self.candidates:
+            return []
+        candidates = list(self.candidates)
+        corners = order_quad(candidates[-1].quad)
+        now = time.monotonic()
+        recent = [candidate for candidate in candidates
+                  if now - candidate.timestamp <= window
+                  and np.linalg.norm(order_quad(candidate.quad) - corners, axis=1).max() <= max_shift]
+        return sorted(recent, key=lambda candidate: candidate.sharpness, reverse=True)
+
+    def read(self, after_seq=0):
+        # Return the newest result if it is newer than after_seq, else None
+        with self._lock:
+            detection = self.latest
+            if detection is None or detection.seq <= after_seq:
+                return None
+            return detection
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+def fit_size(width, height, max_width, max_height):
+    # Largest size with the image's aspect ratio that fits in the given
+    # bounds. Images that already fit keep their size.
+    if width <= max_width and height <= max_height:
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+class ImagePane:
+    # Shows numpy images in a Tk label through one persistent PhotoImage.
+    # Frames are resized with INTER_AREA into a preallocated buffer and
+    # pasted into the PhotoImage in place; the buffers, the PIL image and
+    # the PhotoImage are only rebuilt when the displayed size changes.
+    def __init__(self, widget, mode='RGB'):
+        self.widget = widget
+        self.mode = mode  # 'RGB' for camera frames, 'L' for grayscale pages
+        self.size = None
+        self.buffer = None   # What gets shown, in display size and mode
+        self.scratch = None  # Resized frame before colour conversion
+        self.image = None
+        self.photo = None
+
+    def _allocate(self, size):
+        if size == self.size:
+            return
+        width, height = size
+        channels = 3 if self.mode == 'RGB' else 1
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        self.size = size
+        self.buffer = np.zeros(shape, np.uint8)
+        self.scratch = None
+        self.image = Image.new(self.mode, size)
+        self.photo = ImageTk.PhotoImage(self.mode, size)
+
+    def render(self, image, size=None, conversion=None):
+        # Resize (and optionally colour convert) image into the pane's
+        # buffer and return the buffer, so overlays can be drawn on it
+        # before show()
+        size = size or (image.shape[1], image.shape[0])
+        self._allocate(size)
+        if conversion is None:
+            if image.shape[:2] == self.buffer.shape[:2]:
+                np.copyto(self.buffer, image)
+            else:
+                cv2.resize(image, size, dst=self.buffer, interpolation=cv2.INTER_AREA)
+        else:
+            if image.shape[:2] == self.buffer.shape[:2]:
+                cv2.cvtColor(image, conversion, dst=self.buffer)
+            else:
+                if self.scratch is None or self.scratch.shape[2:] != image.shape[2:]:
+                    self.scratch = np.empty(self.buffer.shape[:2] + image.shape[2:], np.uint8)
+                cv2.resize(image, size, dst=self.scratch, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(self.scratch, conversion, dst=self.buffer)
+        return self.buffer
+
+    def show(self):
+        # Copy the buffer into the PhotoImage. Re-attach it if something
+        # else was put in the label meanwhile.
+        self.image.frombytes(self.buffer)
+        self.photo.paste(self.image)
+        if self.widget.cget('image') != str(self.photo):
+            self.widget.configure(image=self.photo)
+            self.widget.image = self.photo
+
+
+class CanvasPane(ImagePane):
+    # An ImagePane on a Canvas. The image sits at the canvas origin, and a
+    # selection rectangle is a canvas item on top of it, so dragging one
+    # never touches image data.
+    def __init__(self, canvas, mode='RGB', placeholder=None):
+        super().__init__(canvas, mode)
+        self.item = None
+        self.selection = None
+        if placeholder:
+            canvas.create_text(int(canvas['width']) // 2, int(canvas['height']) // 2,
+                               text=placeholder, tags='placeholder')
+
+    def show(self):
+        self.image.frombytes(self.buffer)
+        self.photo.paste(self.image)
+        if self.item is None:
+            self.widget.delete('placeholder')
+            self.item = self.widget.create_image(0, 0, anchor='nw', image=self.photo)
+        elif self.widget.itemcget(self.item, 'image') != str(self.photo):
+            self.widget.itemconfigure(self.item, image=self.photo)
+        if (int(self.widget['width']), int(self.widget['height'])) != self.size:
+            self.widget.configure(width=self.size[0], height=self.size[1])
+        if self.selection is not None:
+            self.widget.tag_raise(self.selection)
+
+    def offset(self):
+        # Top-left corner of the image on the canvas
+        return (0, 0)
+
+    def select(self, start, end, color='blue'):
+        # Show or move the selection rectangle between two canvas points
+        if self.selection is None:
+            self.selection = self.widget.create_rectangle(*start, *end, outline=color, width=2)
+        else:
+            self.widget.coords(self.selection, *start, *end)
+
+    def clear_selection(self):
+        if self.selection is not None:
+            self.widget.delete(self.selection)
+            self.selection = None
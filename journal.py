@@ -0,0 +1,168 @@
+import glob
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from pdf_writer import PageImage, PDFDocument
+
+logger = logging.getLogger('scanner.journal')
+
+# Journals of sessions that have not been saved yet live here
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.scanner', 'sessions')
+
+# Every record is a header (magic, metadata length, data length, CRC32 of
+# metadata + data) followed by JSON metadata and the raw data bytes
+MAGIC = b'SJR1'
+HEADER = struct.Struct('<4sIII')
+
+SESSION = 'session'
+PAGE = 'page'
+
+# Byte locked on Windows to mark a journal as in use. Windows locks are
+# mandatory, so it lies far past any real journal data to never block
+# reading the pages back.
+LOCK_OFFSET = 0x7FFFFFFF
+
+
+def lock_file(file):
+    # Exclusive lock for as long as the file stays open; the OS drops it if
+    # the process dies. Raises OSError if another process holds it.
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        file.seek(LOCK_OFFSET)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        file.seek(0)
+
+
+def unfinished_sessions(directory=JOURNAL_DIR):
+    # Journals left behind by sessions that crashed, oldest first. Some may
+    # still be open in another running instance.
+    return sorted(glob.glob(os.path.join(directory, '*.journal')))
+
+
+def resume_latest(directory=JOURNAL_DIR):
+    # Reopen the newest unfinished journal no running instance is writing,
+    # or return None. Journals that cannot be read (e.g. a crash before the
+    # first record reached the disk) are renamed to *.bad so they never
+    # block a resume again.
+    for path in reversed(unfinished_sessions(directory)):
+        try:
+            return SessionJournal.open(path)
+        except ValueError as e:
+            logger.warning("Setting aside unreadable journal: %s", e)
+            os.replace(path, path + '.bad')
+        except OSError as e:
+            logger.info("Skipping journal in use or unreadable: %s (%s)", path, e)
+    return None
+
+
+class SessionJournal:
+    # Append-only on-disk journal of one scan session. Each page's encoded
+    # bytes are written (and synced) as the page is added, so nothing is
+    # lost if the app or the camera driver dies before the PDF is saved.
+    # Only page metadata and file offsets are kept in memory.
+    # The file stays locked while the journal is open, so another instance
+    # never resumes a session that is still being scanned.
+    def __init__(self, path, session, pages, end, file):
+        self.path = path
+        self.session = session  # Metadata of the session record
+        self.pages = pages      # (metadata, data offset, data length) per page
+        self.file = file        # Open and locked
+        self.file.truncate(end)  # Drop a torn record from a crash mid-write
+        self.file.seek(end)
+
+    @classmethod
+    def create(cls, directory=JOURNAL_DIR, **session):
+        os.makedirs(directory, exist_ok=True)
+        session.setdefault('created', time.time())
+        path = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}.journal")
+        file = open(path, 'w+b')
+        lock_file(file)
+        journal = cls(path, session, [], 0, file)
+        journal._append(dict(session, type=SESSION), b'')
+        return journal
+
+    @classmethod
+    def open(cls, path):
+        # Reopen an unfinished journal, keeping every complete record. Raises
+        # OSError if another instance has it open, ValueError if it holds
+        # no session.
+        session, pages, end = None, [], 0
+        f = open(path, 'r+b')
+        try:
+            lock_file(f)
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                magic, meta_length, data_length, crc = HEADER.unpack(header)
+                meta_bytes = f.read(meta_length)
+                data_offset = f.tell()
+                data = f.read(data_length)
+                if (magic != MAGIC or len(meta_bytes) < meta_length or len(data) < data_length
+                        or zlib.crc32(data, zlib.crc32(meta_bytes)) != crc):
+                    break
+                meta = json.loads(meta_bytes)
+                if meta.pop('type') == SESSION:
+                    session = meta
+                else:
+                    pages.append((meta, data_offset, data_length))
+                end = f.tell()
+            if session is None:
+                raise ValueError(f"Not a session journal: {path}")
+        except BaseException:
+            f.close()
+            raise
+        return cls(path, session, pages, end, f)
+
+    def add_page(self, image, **meta):
+        # Record an encoded page along with its metadata (quad, mode, ...)
+        meta.setdefault('timestamp', time.time())
+        meta['image'] = {key: value for key, value in image._asdict().items() if key != 'data'}
+        offset = self._append(dict(meta, type=PAGE), image.data)
+        self.pages.append((meta, offset, len(image.data)))
+
+    def _append(self, meta, data):
+        meta_bytes = json.dumps(meta).encode()
+        crc = zlib.crc32(data, zlib.crc32(meta_bytes))
+        self.file.write(HEADER.pack(MAGIC, len(meta_bytes), len(data), crc))
+        self.file.write(meta_bytes)
+        offset = self.file.tell()
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return offset
+
+    def page_no(self):
+        return len(self.pages)
+
+    def page_images(self):
+        # Read the encoded pages back one at a time
+        with open(self.path, 'rb') as f:
+            for meta, offset, length in self.pages:
+                f.seek(offset)
+                yield PageImage(data=f.read(length), **meta['image'])
+
+    def build_pdf(self, partial_path, page_width=210, page_height=297):
+        # Replay the journal into a new streaming PDF. Pages are copied as
+        # already-encoded bytes, so nothing is decoded or re-encoded.
+        pdf = PDFDocument(partial_path, page_width, page_height)
+        for image in self.page_images():
+            pdf.add_page(image)
+        return pdf
+
+    def remove(self):
+        # The session was saved or deliberately discarded
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
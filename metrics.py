@@ -0,0 +1,137 @@
+import contextlib
+import csv
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+# Returned by Metrics.stage() while disabled, so a timed block costs one
+# attribute check and an empty with-statement
+_NOT_TIMED = contextlib.nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    # Lightweight per-stage timers with rolling windows of the last
+    # `window` samples. Safe to record from the capture and detection
+    # threads; percentiles are only computed when a snapshot is taken.
+    def __init__(self, enabled=False, window=300):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.events = {}
+        self.counters = {}
+
+    def stage(self, name):
+        # with metrics.stage('detect'): ...
+        if not self.enabled:
+            return _NOT_TIMED
+        return _StageTimer(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def tick(self, name):
+        # Count an event (e.g. a displayed frame) for rate reporting
+        if not self.enabled:
+            return
+        events = self.events.get(name)
+        if events is None:
+            events = self.events.setdefault(name, deque(maxlen=self.window))
+        events.append(time.perf_counter())
+
+    def count(self, name, n=1):
+        # Add to a running total (e.g. frames dropped since start)
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def rate(self, name):
+        events = list(self.events.get(name, ()))
+        if len(events) < 2 or events[-1] == events[0]:
+            return 0.0
+        return (len(events) - 1) / (events[-1] - events[0])
+
+    def snapshot(self):
+        stages = {}
+        for name, samples in list(self.samples.items()):
+            values = np.array(list(samples)) * 1000
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            stages[name] = {'count': len(values), 'mean_ms': float(values.mean()),
+                            'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                            'max_ms': float(values.max())}
+        rates = {name: self.rate(name) for name in list(self.events)}
+        return {'time': time.time(), 'rates': rates, 'counters': dict(self.counters),
+                'stages': stages}
+
+    def overlay_text(self, stages=None):
+        # One line for the status area: rates and totals first, then
+        # p50/p95 per stage
+        snapshot = self.snapshot()
+        parts = [f"{name} {rate:.1f}/s" for name, rate in snapshot['rates'].items()]
+        parts.extend(f"{name} {value}" for name, value in snapshot['counters'].items())
+        for name in stages or snapshot['stages']:
+            stats = snapshot['stages'].get(name)
+            if stats is not None:
+                parts.append(f"{name} {stats['p50_ms']:.1f}/{stats['p95_ms']:.1f} ms")
+        return ' | '.join(parts)
+
+
+class MetricsExporter:
+    # Appends a snapshot every `interval` seconds, as JSON lines or, for a
+    # .csv path, one row per stage
+    CSV_FIELDS = ['time', 'stage', 'rate_per_s', 'total', 'count', 'mean_ms', 'p50_ms', 'p95_ms',
+                  'p99_ms', 'max_ms']
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self.last_export = time.monotonic()
+
+    def maybe_export(self, metrics):
+        now = time.monotonic()
+        if not metrics.enabled or now - self.last_export < self.interval:
+            return
+        self.last_export = now
+        self.export(metrics.snapshot())
+
+    def export(self, snapshot):
+        if self.path.lower().endswith('.csv'):
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.CSV_FIELDS)
+                if new_file:
+                    writer.writeheader()
+                for name, rate in snapshot['rates'].items():
+                    writer.writerow({'time': snapshot['time'], 'stage': name, 'rate_per_s': rate})
+                for name, value in snapshot['counters'].items():
+                    writer.writerow({'time': snapshot['time'], 'stage': name, 'total': value})
+                for name, stats in snapshot['stages'].items():
+                    writer.writerow(dict(stats, time=snapshot['time'], stage=name))
+        else:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(snapshot) + '\n')
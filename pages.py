@@ -0,0 +1,131 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from binarize import GLOBAL, binarize_page
+
+# Kernel used to sharpen the warped page before binarizing
+SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+
+
+def order_quad(quad):
+    # Order corners as top-left, top-right, bottom-right, bottom-left
+    # (same rule as imutils.perspective.order_points, without scipy)
+    quad = np.asarray(quad, dtype=np.float32).reshape(4, 2)
+    by_x = quad[np.argsort(quad[:, 0])]
+    left, right = by_x[:2], by_x[2:]
+    tl, bl = left[np.argsort(left[:, 1])]
+    br, tr = right[np.argsort(np.linalg.norm(right - tl, axis=1))[::-1]]
+    return np.array([tl, tr, br, bl], dtype=np.float32)
+
+
+def page_size(quad):
+    # Natural output size of the flattened page, from its longest edges
+    tl, tr, br, bl = order_quad(quad)
+    width = max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl))
+    height = max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl))
+    return max(int(width), 1), max(int(height), 1)
+
+
+def page_transform(quad, size=None):
+    # Homography taking the quad onto a (width, height) page
+    width, height = size if size is not None else page_size(quad)
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]],
+                      dtype=np.float32)
+    return cv2.getPerspectiveTransform(order_quad(quad), target), (width, height)
+
+
+class WarpCache:
+    # Keeps homographies and precomputed remap tables for recently seen
+    # quads. Quads are quantized to `tolerance` pixels, so a page sitting
+    # still on the stand reuses the same tables instead of recomputing the
+    # transform every frame. A small LRU keeps a few stand positions hot.
+    def __init__(self, tolerance=1.0, max_entries=8):
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, quad, size=None):
+        # Return (homography, (map1, map2), (width, height)) for the quad
+        snapped = np.round(order_quad(quad) / self.tolerance)
+        key = (tuple(snapped.astype(np.int64).ravel()), size)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        matrix, (width, height) = page_transform(snapped * self.tolerance, size)
+        entry = (matrix, self._remap_tables(matrix, width, height), (width, height))
+        self.entries[key] = entry
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _remap_tables(matrix, width, height):
+        # For every page pixel, the frame position it is sampled from
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float32),
+                             np.arange(height, dtype=np.float32))
+        points = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+        source = cv2.perspectiveTransform(points, np.linalg.inv(matrix)).reshape(height, width, 2)
+        return cv2.convertMaps(source, None, cv2.CV_16SC2)
+
+    def warp(self, frame, quad, size=None):
+        _, (map1, map2), _ = self.lookup(quad, size)
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def warp_page(frame, quad, size=None, cache=None):
+    # Flatten the document under the four corner points. With a size the
+    # page is warped straight to (width, height) instead of its natural size.
+    if cache is not None:
+        return cache.warp(frame, quad, size)
+    matrix, (width, height) = page_transform(quad, size)
+    return cv2.warpPerspective(frame, matrix, (width, height))
+
+
+def enhance_page(warped, binarize=True, method=GLOBAL):
+    # Sharpen, convert to grayscale and binarize the flattened page. Photos
+    # skip the binarization and stay 8-bit grayscale. See binarize.py for
+    # the methods.
+    sharpened_image = cv2.filter2D(warped, -1, SHARPEN_KERNEL)
+    gray = cv2.cvtColor(sharpened_image, cv2.COLOR_BGR2GRAY)
+    if not binarize:
+        return gray
+    return binarize_page(gray, method)
+
+
+def render_page(frame, quad, size=None, cache=None, binarize=True, method=GLOBAL):
+    # Warp and enhance in one go; used for both the preview and the full page
+    return enhance_page(warp_page(frame, quad, size, cache), binarize, method)
+
+
+def sharpness(gray):
+    # Variance of the Laplacian: high for crisp text, low for motion blur.
+    # 16-bit is enough for 8-bit input and much cheaper than float.
+    _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(stddev[0, 0]) ** 2
+
+
+def quad_sharpness(frame, quad, scale=4):
+    # Sharpness of the page area of a frame, measured at 1/scale so it is
+    # cheap enough to score every frame
+    x, y, w, h = cv2.boundingRect(quad.astype(np.int32))
+    x, y = max(x, 0), max(y, 0)
+    patch = frame[y:y + h, x:x + w]
+    if patch.size == 0:
+        return 0.0
+    if patch.ndim == 3:
+        patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    if scale > 1:
+        patch = cv2.resize(patch, (max(patch.shape[1] // scale, 1), max(patch.shape[0] // scale, 1)),
+                           interpolation=cv2.INTER_AREA)
+    return sharpness(patch)
@@ -0,0 +1,154 @@
+import io
+import os
+import shutil
+import zlib
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# PDF user space is in points; pages are given in millimetres like FPDF
+MM_TO_PT = 72 / 25.4
+
+# Page encodings: 1-bit for thresholded text pages, 8-bit JPEG for photos
+BILEVEL = 'bilevel'
+GRAYSCALE = 'grayscale'
+
+# An already encoded page image, ready to be embedded as-is in the PDF.
+# filter is the PDF filter that decodes data (e.g. DCTDecode for JPEG) and
+# decode_parms its optional /DecodeParms dictionary.
+PageImage = namedtuple('PageImage', ['data', 'width', 'height', 'color_space', 'bits', 'filter',
+                                     'decode_parms'])
+
+
+def jpeg_image(page, quality=95):
+    # Encode a grayscale or BGR page as JPEG bytes in memory
+    ok, encoded = cv2.imencode('.jpg', page, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode page as JPEG")
+    height, width = page.shape[:2]
+    color_space = 'DeviceGray' if page.ndim == 2 else 'DeviceRGB'
+    return PageImage(encoded.tobytes(), width, height, color_space, 8, 'DCTDecode', None)
+
+
+def flate_bilevel_image(page):
+    # Pack a binarized page to 1 bit per pixel (1 = white) and deflate it
+    height, width = page.shape[:2]
+    packed = np.packbits(page > 127, axis=1)
+    return PageImage(zlib.compress(packed.tobytes(), 6), width, height, 'DeviceGray', 1,
+                     'FlateDecode', None)
+
+
+def g4_image(page):
+    # CCITT Group 4 encode a binarized page through Pillow's libtiff. The TIFF
+    # is written as a single strip, which is exactly the G4 stream PDF wants.
+    from PIL import Image, features
+    if not features.check('libtiff'):
+        return None
+
+    height, width = page.shape[:2]
+    buffer = io.BytesIO()
+    Image.fromarray(page > 127).save(buffer, 'TIFF', compression='group4',
+                                     tiffinfo={278: height})
+    tiff = Image.open(io.BytesIO(buffer.getvalue()))
+    offsets, counts = tiff.tag_v2.get(273), tiff.tag_v2.get(279)
+    if offsets is None or len(offsets) != 1:
+        return None
+    data = buffer.getvalue()[offsets[0]:offsets[0] + counts[0]]
+    parms = f"<< /K -1 /Columns {width} /Rows {height} /BlackIs1 true >>"
+    return PageImage(data, width, height, 'DeviceGray', 1, 'CCITTFaxDecode', parms)
+
+
+def bilevel_image(page):
+    # Prefer CCITT G4, falling back to 1-bit Flate without libtiff
+    try:
+        image = g4_image(page)
+    except (ImportError, OSError):
+        image = None
+    return image if image is not None else flate_bilevel_image(page)
+
+
+def encode_page(page, mode=BILEVEL):
+    if mode == BILEVEL:
+        return bilevel_image(page)
+    if mode == GRAYSCALE:
+        return jpeg_image(page)
+    raise ValueError(f"Unknown page mode: {mode}")
+
+
+class PDFDocument:
+    # Streaming PDF writer for scanned pages. Every page is one image that
+    # fills the page. Each page's objects are appended to a partial file as
+    # soon as the page is added, so memory stays flat however long the
+    # session runs; output() only writes the page tree, xref and trailer
+    # and moves the file into place.
+    #
+    # Object layout: 1 catalog, 2 page tree, then 3 objects per page
+    # (page, content stream, image). The catalog and page tree are written
+    # last, since only then are all the pages known.
+    def __init__(self, partial_path, page_width=210, page_height=297):
+        self.partial_path = partial_path
+        self.page_width = page_width * MM_TO_PT
+        self.page_height = page_height * MM_TO_PT
+        self.offsets = {}
+        self.page_count = 0
+        self.file = open(partial_path, 'wb')
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_page(self, image):
+        page_num = 3 + self.page_count * 3
+        self._write_object(page_num, self._page_object(self.page_count, page_num))
+        self._write_object(page_num + 1, self._content_object(self.page_count))
+        self._write_object(page_num + 2, self._image_object(image))
+        self.page_count += 1
+        self.file.flush()
+
+    def page_no(self):
+        return self.page_count
+
+    def output(self, filename):
+        kids = ' '.join(f"{3 + index * 3} 0 R" for index in range(self.page_count))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {self.page_count} >>".encode())
+
+        size = len(self.offsets) + 1
+        xref_offset = self.file.tell()
+        xref = [f"xref\n0 {size}\n0000000000 65535 f \n"]
+        xref += [f"{self.offsets[num]:010d} 00000 n \n" for num in range(1, size)]
+        xref.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self.file.write(''.join(xref).encode())
+        self.file.close()
+
+        # A rename when the destination is on the same drive
+        shutil.move(self.partial_path, filename)
+
+    def discard(self):
+        # Drop the pages written so far
+        self.file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def _write_object(self, num, body):
+        self.offsets[num] = self.file.tell()
+        self.file.write(f"{num} 0 obj\n".encode())
+        self.file.write(body)
+        self.file.write(b"\nendobj\n")
+
+    def _page_object(self, index, page_num):
+        return (f"<< /Type /Page /Parent 2 0 R "
+                f"/MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+                f"/Resources << /XObject << /Im{index} {page_num + 2} 0 R >> >> "
+                f"/Contents {page_num + 1} 0 R >>").encode()
+
+    def _content_object(self, index):
+        # Stretch the image over the whole page
+        content = f"q {self.page_width:.2f} 0 0 {self.page_height:.2f} 0 0 cm /Im{index} Do Q".encode()
+        return f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream"
+
+    def _image_object(self, image):
+        parms = f"/DecodeParms {image.decode_parms} " if image.decode_parms else ""
+        header = (f"<< /Type /XObject /Subtype /Image /Width {image.width} "
+                  f"/Height {image.height} /ColorSpace /{image.color_space} "
+                  f"/BitsPerComponent {image.bits} /Filter /{image.filter} {parms}"
+                  f"/Length {len(image.data)} >>\nstream\n").encode()
+        return header + image.data + b"\nendstream"
@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+
+class PageView:
+    # Maps widget pixels to normalized page coordinates (0..1 across
+    # and down the page) for a page shown at display_size, with its top-left
+    # corner at offset inside the widget
+    def __init__(self, display_size, offset=(0, 0)):
+        self.display_size = display_size
+        self.offset = offset
+
+    def to_page(self, x, y):
+        width, height = self.display_size
+        u = (x - self.offset[0]) / width
+        v = (y - self.offset[1]) / height
+        return min(max(u, 0.0), 1.0), min(max(v, 0.0), 1.0)
+
+
+class RedactionMask:
+    # Areas to white out of a page, kept in normalized page coordinates so
+    # they land on the same content at preview and at full resolution. The
+    # preview's mask is rasterized once and reused until the areas change;
+    # applying it is a single cv2.max over the page. Only one mask is kept,
+    # since full resolution pages differ in size every time.
+    def __init__(self):
+        self.rects = []  # (u0, v0, u1, v1), each 0..1
+        self._mask = None  # (size, mask) last kept
+
+    def __len__(self):
+        return len(self.rects)
+
+    def add(self, start, end):
+        # start and end are opposite corners, in page coordinates
+        (u0, v0), (u1, v1) = start, end
+        rect = (min(u0, u1), min(v0, v1), max(u0, u1), max(v0, v1))
+        if rect[2] > rect[0] and rect[3] > rect[1]:
+            self.rects.append(rect)
+            self._mask = None
+
+    def copy(self):
+        # A snapshot for a page that is finished on another thread
+        other = RedactionMask()
+        other.rects = list(self.rects)
+        return other
+
+    def clear(self):
+        self.rects = []
+        self._mask = None
+
+    def mask(self, size, keep=True):
+        # 255 where the page is redacted, 0 elsewhere, for a (width, height)
+        # page. With keep it replaces the mask kept for reuse.
+        if self._mask is not None and self._mask[0] == size:
+            return self._mask[1]
+        width, height = size
+        mask = np.zeros((height, width), np.uint8)
+        for u0, v0, u1, v1 in self.rects:
+            # Cover every pixel the area touches
+            x0, y0 = int(np.floor(u0 * width)), int(np.floor(v0 * height))
+            x1, y1 = int(np.ceil(u1 * width)), int(np.ceil(v1 * height))
+            mask[y0:y1, x0:x1] = 255
+        if keep:
+            self._mask = (size, mask)
+        return mask
+
+    def apply(self, page, keep=True):
+        # White out the redacted areas of a grayscale page, in place. Pass
+        # keep=False for a one-off page, such as a full resolution one.
+        if self.rects:
+            cv2.max(page, self.mask((page.shape[1], page.shape[0]), keep), dst=page)
+        return page
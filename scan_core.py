@@ -0,0 +1,65 @@
+# GUI-free scan pipeline: ROI crop, document detection, warp, enhance,
+# binarize and page encoding, shared by the GUI front ends, the detection
+# worker and batch_scan. Nothing in here (or in the modules it pulls in)
+# imports tkinter, PIL.ImageTk, speech or imutils, so worker processes start
+# with just OpenCV and numpy; Pillow is only imported once a page is
+# actually CCITT G4 encoded.
+import numpy as np
+
+from binarize import BRADLEY, GLOBAL, METHODS, OTSU, SAUVOLA, WOLF, binarize_page
+from detection import (centered_roi, find_document_quad, find_document_quad_pyramid,
+                       refine_corners, scale_roi, search_window)
+from pages import (WarpCache, enhance_page, order_quad, page_size, quad_sharpness, render_page,
+                   sharpness, warp_page)
+from pdf_writer import BILEVEL, GRAYSCALE, PageImage, encode_page
+
+__all__ = [
+    'BILEVEL', 'BRADLEY', 'GLOBAL', 'GRAYSCALE', 'METHODS', 'OTSU', 'PageImage', 'SAUVOLA',
+    'WOLF', 'WarpCache', 'binarize_page', 'centered_roi', 'crop_roi', 'encode_page',
+    'enhance_page', 'find_document_quad', 'find_document_quad_pyramid', 'locate_document',
+    'order_quad', 'page_size', 'quad_sharpness', 'refine_corners', 'render_page', 'scale_roi',
+    'scan_frame', 'scan_page', 'search_window', 'sharpness', 'warp_page',
+]
+
+
+def crop_roi(image, roi):
+    # Return the (x1, y1, x2, y2) region of the image and its top-left offset
+    if roi is None:
+        return image, (0, 0)
+    x1, y1, x2, y2 = roi
+    return image[y1:y2, x1:x2], (x1, y1)
+
+
+def locate_document(image, roi=None, pyramid_scale=4):
+    # Corners of the document in full image coordinates, or None
+    roi_image, offset = crop_roi(image, roi)
+    quad = find_document_quad_pyramid(roi_image, pyramid_scale)
+    if quad is None:
+        return None
+    return quad + np.array(offset)
+
+
+def scan_frame(image, roi=None, pyramid_scale=4, size=None, binarize=True, cache=None,
+               method=GLOBAL):
+    # Detect, warp and enhance in one call. Returns (quad, page), or
+    # (None, None) when no document was found.
+    quad = locate_document(image, roi, pyramid_scale)
+    if quad is None:
+        return None, None
+    return quad, render_page(image, quad, size, cache, binarize, method)
+
+
+def scan_page(image, roi=None, pyramid_scale=4, mode=BILEVEL, keep_undetected=False, cache=None,
+              method=GLOBAL):
+    # Full pipeline from a camera frame or photo to an encoded PageImage.
+    # Without a detected document the page is skipped (None), or the whole
+    # image is used when keep_undetected is set.
+    quad, page = scan_frame(image, roi, pyramid_scale, binarize=mode == BILEVEL, cache=cache,
+                            method=method)
+    if quad is None:
+        if not keep_undetected:
+            return None
+        height, width = image.shape[:2]
+        quad = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+        page = render_page(image, quad, binarize=mode == BILEVEL, cache=cache, method=method)
+    return encode_page(page, mode)
@@ -0,0 +1,87 @@
+import time
+
+
+class FrameScheduler:
+    # Drives a single Tk render loop. Each tick is timed for when the camera
+    # should have its next frame, but never faster than max_fps. While no
+    # frames arrive the loop backs off to idle_interval. request() keeps at
+    # most one tick pending, so extra wake-ups (window resizes, button
+    # handlers) are folded into the next tick instead of starting new loops.
+    def __init__(self, root, tick, max_fps=30, idle_interval=0.1, poll_interval=0.005):
+        self.root = root
+        self.tick = tick  # Returns the timestamp of the frame it showed, or None
+        self.min_interval = 1.0 / max_fps
+        self.idle_interval = idle_interval
+        self.poll_interval = poll_interval
+
+        self.frame_interval = None  # Smoothed camera frame period
+        self.late = 0.0  # How late the last tick ran, i.e. time Tk spent elsewhere
+        self._last_frame_time = None
+        self._misses = 0
+        self._after_id = None
+        self._due = None
+        self._stopped = False
+
+    def start(self):
+        self._stopped = False
+        self.request()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def request(self, delay=0.0):
+        # Run a tick within `delay` seconds, unless one is already due sooner
+        if self._stopped:
+            return
+        due = time.monotonic() + delay
+        if self._after_id is not None:
+            if self._due <= due:
+                return
+            self.root.after_cancel(self._after_id)
+        self._due = due
+        self._after_id = self.root.after(max(int(delay * 1000), 1), self._run)
+
+    def _run(self):
+        self._after_id = None
+        started = time.monotonic()
+        self.late = max(started - self._due, 0.0)
+        frame_time = None
+        try:
+            frame_time = self.tick()
+        finally:
+            if not self._stopped:
+                due = self._next_due(started, frame_time)
+                self.request(max(due - time.monotonic(), 0.0))
+
+    def _next_due(self, started, frame_time):
+        if frame_time is None:
+            # Nothing new yet: poll again soon, backing off while the camera is quiet
+            self._misses += 1
+            expected = self._expected_frame()
+            if expected is not None and expected > started:
+                return expected
+            return started + min(self.poll_interval * 2 ** min(self._misses - 1, 5),
+                                 self.idle_interval)
+
+        if self._last_frame_time is not None:
+            period = frame_time - self._last_frame_time
+            if 0 < period < self.idle_interval:
+                # Several ticks may pass per frame, so keep the shortest
+                # recent period rather than averaging in skipped frames
+                if self.frame_interval is None or period < self.frame_interval:
+                    self.frame_interval = period
+                else:
+                    self.frame_interval += 0.05 * (period - self.frame_interval)
+        self._last_frame_time = frame_time
+        self._misses = 0
+        return max(started + self.min_interval, self._expected_frame() or 0.0)
+
+    def _expected_frame(self):
+        if self._last_frame_time is None or self.frame_interval is None:
+            return None
+        # A little slack so the frame is in the grabber when we look
+        return self._last_frame_time + self.frame_interval + 0.002
@@ -0,0 +1,38 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger('scanner.station')
+
+# Settings for this particular scanning station (camera placement, ROI, ...)
+# that override the defaults in the GUI, e.g.
+#   {"ROI": [0.2, 0.05, 0.8, 1.0], "WIDTH": 1280, "HEIGHT": 720}
+STATION_FILE = os.path.join(os.path.expanduser('~'), '.scanner', 'station.json')
+
+
+def load_station(path=STATION_FILE):
+    # The station's settings, or {} if there are none or they can't be read
+    try:
+        with open(path) as f:
+            settings = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring station settings in %s: %s", path, e)
+        return {}
+    if not isinstance(settings, dict):
+        logger.warning("Ignoring station settings in %s: expected a JSON object", path)
+        return {}
+    return settings
+
+
+def apply_station(target, settings):
+    # Override the target's upper-case settings with the station's. Unknown
+    # names are reported rather than silently added.
+    for name, value in settings.items():
+        if name.isupper() and hasattr(target, name):
+            if isinstance(getattr(target, name), tuple) and isinstance(value, list):
+                value = tuple(value)
+            setattr(target, name, value)
+        else:
+            logger.warning("Unknown station setting %s", name)
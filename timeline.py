@@ -0,0 +1,35 @@
+import logging
+import threading
+import time
+
+# Taken when this module is first imported. Front ends import it before
+# anything heavy, so the timeline includes their own import time.
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger('scanner.startup')
+
+
+class StartupTimeline:
+    # Records when startup milestones (window shown, first frame, first
+    # detected quad, ...) are first reached, in seconds since launch
+    def __init__(self, origin=PROCESS_START):
+        self.origin = origin
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        # Only the first time a milestone is reached counts; cheap afterwards
+        if name in self.marks:
+            return
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = time.perf_counter() - self.origin
+        logger.info("startup: %s after %.3f s", name, self.marks[name])
+
+    def elapsed(self, name):
+        return self.marks.get(name)
+
+    def summary(self):
+        return ', '.join(f"{name} {seconds:.3f} s"
+                         for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]))
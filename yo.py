@@ -1,39 +1,93 @@
+from timeline import StartupTimeline
+import logging
 import tkinter as tk
 from tkinter import filedialog
 import cv2
-from PIL import Image, ImageTk
 import numpy as np
 from datetime import datetime
 import os
-import pyttsx3
 import threading
-from fpdf import FPDF
-from imutils.perspective import four_point_transform
+from concurrent.futures import ThreadPoolExecutor
+import time
 import queue
+from cameras import CameraPool
+from detection import DetectionWorker
+from pdf_writer import PDFDocument
+from scan_core import BILEVEL, SAUVOLA, encode_page, enhance_page, render_page
+from denoise import MEDIAN, denoise_page
+from journal import SessionJournal, resume_latest
+from metrics import Metrics, MetricsExporter
+from scheduler import FrameScheduler
+from redaction import PageView, RedactionMask
+from display import CanvasPane, ImagePane, fit_size
+from autocapture import AutoCapture
+from station import apply_station, load_station
+
+logger = logging.getLogger('scanner.gui')
 
 class ScannerGUI:
     def __init__(self, root):
+        self.startup = StartupTimeline()
         self.root = root
         self.root.title("A.F.P.M.B.A.I Scanner Application")
         
         # Initialize scanner variables
         self.WIDTH = 1920
         self.HEIGHT = 1080
+        # Detection area as fractions of the frame (x1, y1, x2, y2), so it fits
+        # any camera mode; 1300x1080 in the middle of a 1920x1080 frame
+        self.ROI = (0.16, 0.0, 0.84, 1.0)
+        self.SEARCH_MARGIN = 0.25  # Search only this far around a found page; None for the whole ROI
+        self.DETECTION_SCALE = 4  # Find the quad at 1/4 scale, refine at full size
+        self.REDETECT_INTERVAL = 15  # Track the quad, fully re-detect every 15 frames
+        self.PREVIEW_SIZE = (600, 800)  # Document preview is rendered at this size
+        self.PAGE_MODE = BILEVEL  # 1-bit pages; use GRAYSCALE (8-bit JPEG) for photos
+        self.BINARIZE_METHOD = SAUVOLA  # Copes with uneven light; GLOBAL is the old fixed 128
+        self.SHOW_METRICS = False  # Stage timing overlay; F2 toggles it at runtime
+        self.METRICS_LOG = None  # e.g. 'scanner_metrics.jsonl' or '.csv' to export snapshots
+        self.MAX_FPS = 30  # Upper bound on preview refreshes per second
+        self.WARM_CAMERAS = 2  # Cameras kept open so switching between them is instant
+        self.BURST_FRAMES = 12  # Recent frames kept to pick the sharpest from on "Add page"
+        self.BURST_WINDOW = 0.4  # ... taken from the last this many seconds
+        self.DENOISE_FRAMES = 0  # Fuse up to this many of those frames per page; 0 or 1 is off
+        self.DENOISE_METHOD = MEDIAN  # MEDIAN also drops a passing hand; MEAN removes more noise
+        self.DENOISE_REFINE = False  # Phase correlation on top of the quads, for a shaky stand
+        self.AUTO_CAPTURE = False  # Add pages hands-free once they sit still on the stand
+        self.AUTO_CAPTURE_STEADY = 0.6  # Seconds the page corners must stay put
+        self.AUTO_CAPTURE_MOTION = 2.0  # Max corner movement in pixels while steady
+        self.AUTO_CAPTURE_SHARPNESS = 100.0  # Min Laplacian variance of the page area
+        apply_station(self, load_station())  # This station's own settings win
         self.A4_width = 210
         self.A4_height = 297
         self.scanning = False
         self.selecting = False
         self.drawing = False
         self.pdf = None
-        self.whitened_rects = []
+        self.journal = None
+        self.redactions = RedactionMask()  # Areas to white out, in page coordinates
         self.preview = None
+        self.document_dirty = False  # The document pane needs a redraw
         self.scanned = None
+        self.page_frame = None
+        self.page_quad = None
+        # Fused pages are finished here, one at a time, so they stay in order
+        self.page_worker = ThreadPoolExecutor(max_workers=1)
+        self.page_jobs = []  # Pages submitted to the page worker and not yet reported
         self.rect_start = None
         self.rect_end = None
-        
-        # Initialize text-to-speech
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', 175)
+
+        # Fires "Add page" once a sheet is steady and sharp, then waits for the next one
+        self.auto_capture_enabled = self.AUTO_CAPTURE
+        self.auto_capture = AutoCapture(steady=self.AUTO_CAPTURE_STEADY,
+                                        max_motion=self.AUTO_CAPTURE_MOTION,
+                                        min_sharpness=self.AUTO_CAPTURE_SHARPNESS)
+
+        # Per-stage timing; nearly free while disabled
+        self.metrics = Metrics(enabled=self.SHOW_METRICS or bool(self.METRICS_LOG))
+        self.metrics_exporter = MetricsExporter(self.METRICS_LOG) if self.METRICS_LOG else None
+        self.last_overlay = 0.0
+        self.window_size = None
+        self.redraw_pending = False
         
         # Create "Scanned Files" directory in Documents
         self.destination_folder = os.path.join(os.path.expanduser('~'), 'Downloads')
@@ -42,10 +96,28 @@ class ScannerGUI:
         # Initialize camera index
         self.camera_index = 1 
         
-        # Setup camera
-        self.cap = cv2.VideoCapture(self.camera_index, cv2.CAP_DSHOW)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.HEIGHT)
+        # Open the camera first, on its own capture thread, so frames can be
+        # shown as soon as possible; everything else starts up around it
+        self.cameras = CameraPool(self.WIDTH, self.HEIGHT, keep_open=self.WARM_CAMERAS,
+                                  metrics=self.metrics)
+        self.grabber = self.cameras.activate(self.camera_index)
+        self.last_frame_seq = 0
+
+        # Then find the other cameras and open them in the background
+        self.cameras.enumerate()
+
+        # Run document detection off the UI thread
+        self.detector = DetectionWorker(self.grabber, self.ROI, normalize=True,
+                                        pyramid_scale=self.DETECTION_SCALE,
+                                        redetect_interval=self.REDETECT_INTERVAL,
+                                        preview_size=self.PREVIEW_SIZE,
+                                        burst_size=self.BURST_FRAMES,
+                                        binarize=self.PAGE_MODE == BILEVEL,
+                                        binarize_method=self.BINARIZE_METHOD,
+                                        search_margin=self.SEARCH_MARGIN,
+                                        metrics=self.metrics).start()
+        self.last_detection_seq = 0
+        self.quad = None
         
         # Initialize speech queue and thread
         self.speech_queue = queue.Queue()
@@ -53,16 +125,28 @@ class ScannerGUI:
         self.speech_thread.daemon = True  # Allow thread to exit when the main program exits
         self.speech_thread.start()
 
+        # Replay an unfinished session in the background
+        self.resumed_pages = None
+        self.resume_thread = threading.Thread(target=self.resume_session, daemon=True)
+        self.resume_thread.start()
+
         # Create GUI layout
         self.create_gui_elements()
         
-        # Start video stream
-        self.update_video()
+        # Start video stream: one loop, woken when the camera should have a new frame
+        self.scheduler = FrameScheduler(self.root, self.update_video, max_fps=self.MAX_FPS).start()
         
         # Initial speak
         self.speak("Initializing A.F.P.M.B.A.I. Scanner Application")
 
     def process_speech_queue(self):
+        # Initialize text-to-speech here, off the UI thread. Anything spoken
+        # before the engine is ready simply waits in the queue.
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        self.engine.setProperty('rate', 175)
+        self.startup.mark('speech_ready')
+
         while True:
             text = self.speech_queue.get()
             if text is None:  # Exit signal
@@ -97,6 +181,17 @@ class ScannerGUI:
                                    pady=10)
         self.status_label.pack(pady=(0, 10))
 
+        # Optional FPS/latency overlay under the status text
+        self.metrics_var = tk.StringVar(value="")
+        self.metrics_label = tk.Label(self.top_frame,
+                                      textvariable=self.metrics_var,
+                                      bg='#f0f0f0',
+                                      font=('Consolas', 10))
+        self.metrics_visible = False
+        if self.SHOW_METRICS:
+            self.toggle_metrics()
+        self.root.bind('<F2>', self.toggle_metrics)
+
         # Create a frame for the side-by-side previews
         self.preview_container = tk.Frame(self.top_frame, bg='#f0f0f0')
         self.preview_container.pack(fill=tk.BOTH, expand=True)
@@ -112,10 +207,18 @@ class ScannerGUI:
         self.document_frame = tk.Frame(self.preview_container, bg='#e8e8e8')
         self.document_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        self.document_label = tk.Label(self.document_frame, 
-                                     text="Document Preview",
-                                     bg='#e8e8e8')
-        self.document_label.place(relx=0.5, rely=0.5, anchor='center')
+        # A canvas, so the edit selection can be drawn over the page as an item
+        self.document_canvas = tk.Canvas(self.document_frame,
+                                         width=self.PREVIEW_SIZE[0],
+                                         height=self.PREVIEW_SIZE[1],
+                                         bg='#e8e8e8',
+                                         highlightthickness=0)
+        self.document_canvas.place(relx=0.5, rely=0.5, anchor='center')
+
+        # Both previews are drawn into persistent images updated in place
+        self.camera_pane = ImagePane(self.camera_label)
+        self.document_pane = CanvasPane(self.document_canvas, mode='L',
+                                        placeholder="Document Preview")
 
         # Buttons
         self.create_buttons()
@@ -124,8 +227,15 @@ class ScannerGUI:
         self.root.bind("<Configure>", self.on_window_resize)
 
     def on_window_resize(self, event):
-        # Update the previews when the window is resized
-        self.update_video()
+        # <Configure> also fires for every child widget that changes (the
+        # preview labels do on each new image), so only a real resize of the
+        # window counts. A drag fires dozens of these; they all fold into one
+        # redraw per refresh interval.
+        if event.widget is not self.root or (event.width, event.height) == self.window_size:
+            return
+        self.window_size = (event.width, event.height)
+        self.redraw_pending = True
+        self.scheduler.request(self.scheduler.min_interval)
 
     def create_buttons(self):
         button_frame = tk.Frame(self.bottom_frame, bg='#f0f0f0')
@@ -142,6 +252,15 @@ class ScannerGUI:
                               height=2)
         scan_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.auto_button = tk.Button(button_frame,
+                                     text=self.auto_capture_label(),
+                                     command=self.handle_auto_capture,
+                                     bg='#e8e8e8',
+                                     font=('Arial', 11),
+                                     width=20,
+                                     height=2)
+        self.auto_button.pack(side=tk.LEFT, padx=5, pady=5)
+
         save_button = tk.Button(button_frame,
                               text="Save PDF",
                               command=self.handle_save,
@@ -200,6 +319,17 @@ class ScannerGUI:
                               height=2)
         exit_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+    def auto_capture_label(self):
+        return "Auto capture: On" if self.auto_capture_enabled else "Auto capture: Off"
+
+    def handle_auto_capture(self):
+        self.auto_capture_enabled = not self.auto_capture_enabled
+        self.auto_capture.reset()
+        self.auto_button.configure(text=self.auto_capture_label())
+        state = "on" if self.auto_capture_enabled else "off"
+        self.status_var.set(f"Auto capture {state}")
+        self.speak(f"Auto capture {state}")
+
     def handle_select_folder(self):
         # Allow user to select a preferred folder
         selected_folder = filedialog.askdirectory()
@@ -209,172 +339,234 @@ class ScannerGUI:
             self.speak(f"Selected folder: {self.destination_folder}")
 
     def handle_switch_camera(self):
-        # Release the current camera
-        if self.cap.isOpened():
-            self.cap.release()
-
-        # Switch to the next camera (assuming you have multiple cameras)
-        self.camera_index = (self.camera_index + 1) % 2  # Toggle between 0 and 1
-        self.cap = cv2.VideoCapture(self.camera_index, cv2.CAP_DSHOW)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.HEIGHT)
+        # Switch to the next camera found. Cameras stay open in the pool, so
+        # this never waits on a device.
+        self.camera_index = self.cameras.next_index(self.camera_index)
+        self.grabber = self.cameras.activate(self.camera_index)
+        self.last_frame_seq = 0
+        self.detector.set_source(self.grabber)
+        self.last_detection_seq = 0
+        self.quad = None
+        self.auto_capture.reset()
 
         # Update the status
         self.status_var.set(f"Switched to camera {self.camera_index}")
         self.speak(f"Switched to camera {self.camera_index}")
 
-    def resize_image_to_fit(self, image, max_width, max_height):
-        # Resize the image to fit within the given dimensions while maintaining aspect ratio
-        height, width = image.shape[:2]
-        aspect_ratio = width / height
-
-        if width > max_width or height > max_height:
-            if aspect_ratio > 1:  # Landscape
-                new_width = max_width
-                new_height = int(new_width / aspect_ratio)
-            else:  # Portrait
-                new_height = max_height
-                new_width = int(new_height * aspect_ratio)
-
-            # Ensure new dimensions are valid
-            if new_width <= 0 or new_height <= 0:
-                new_width = width
-                new_height = height
-
-            if new_width > max_width or new_height > max_height:
-                if new_width > max_width:
-                    new_width = max_width
-                    new_height = int(new_width / aspect_ratio)
-                if new_height > max_height:
-                    new_height = max_height
-                    new_width = int(new_height * aspect_ratio)
-
-            # Ensure new dimensions are valid
-            if new_width <= 0 or new_height <= 0:
-                new_width = width
-                new_height = height
-
-            image = cv2.resize(image, (new_width, new_height))
-        return image
-
     def update_video(self):
-        if self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                cv2.normalize(frame, frame, 0, 255, cv2.NORM_MINMAX)
-                # Frame processing
-                width = 1920
-                height = 1080
-                roi_width = 1300
-                roi_height = 1080
-                x1 = (width - roi_width) // 2
-                y1 = (height - roi_height) // 2
-                x2 = x1 + roi_width
-                y2 = y1 + roi_height
-                
-                frame_roi = frame[y1:y2, x1:x2]
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-                # Process ROI for document detection
-                gray = cv2.cvtColor(frame_roi, cv2.COLOR_BGR2GRAY)
-                blur = cv2.GaussianBlur(gray, (5, 5), 0)
-                _, threshold = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                
-                contours, _ = cv2.findContours(threshold, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-                contours = sorted(contours, key=cv2.contourArea, reverse=True)
-
-                # Find document contour
-                for contour in contours:
-                    area = cv2.contourArea(contour)
-                    if area > 1000:
-                        peri = cv2.arcLength(contour, True)
-                        approx = cv2.approxPolyDP(contour, 0.015 * peri, True)
-                        if len(approx) == 4:
-                            adjusted_contour = approx + np.array([x1, y1])
-                            cv2.drawContours(frame, [adjusted_contour], -1, (0, 255, 0), 3)
-                            
-                            # Store the processed image for scanning
-                            warped = four_point_transform(frame, adjusted_contour.reshape(4, 2))
-                            kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-                            sharpened_image = cv2.filter2D(warped, -1, kernel)
-                            self.scanned = cv2.cvtColor(sharpened_image, cv2.COLOR_BGR2GRAY)
-                            _, self.scanned = cv2.threshold(self.scanned, 128, 255, cv2.THRESH_BINARY)
-                            
-                            # Create initial preview
-                            self.preview = self.scanned.copy()
-                            break
-
-                # Convert camera frame for display
-                camera_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
+        self.startup.mark('window')  # The first tick runs once the window is up
+        # How late Tk ran us: time spent rendering and handling other events
+        self.metrics.record('tk_delay', self.scheduler.late)
+
+        # Report pages that were finished on the page worker, in order
+        while self.page_jobs and self.page_jobs[0].done():
+            self.report_page_job(self.page_jobs.pop(0))
+
+        # Report a session that was resumed in the background
+        if self.resumed_pages is not None:
+            self.status_var.set(f"Resumed unsaved session. Total pages: {self.resumed_pages}")
+            self.speak("Resumed unsaved scan session")
+            self.resumed_pages = None
+
+        # Only take the newest frame; never wait on the camera here
+        latest = self.grabber.read(self.last_frame_seq)
+        if latest is None and self.redraw_pending:
+            # The window changed size: show the last frame again at the new size
+            latest = self.grabber.read()
+        self.redraw_pending = False
+        if latest is not None:
+            self.last_frame_seq = latest.seq
+            frame = latest.image
+            self.startup.mark('first_frame')
+            self.metrics.tick('display')
+            self.metrics.record('frame_age', time.monotonic() - latest.timestamp)
+
+            # Pick up the newest detection result, if any
+            detection = self.detector.read(self.last_detection_seq)
+            if detection is not None:
+                self.last_detection_seq = detection.seq
+                self.quad = detection.quad
+                if self.quad is not None:
+                    self.startup.mark('first_quad')
+                if detection.page is not None:
+                    # Store the preview page and the frame and quad it came
+                    # from, so the full page can be rendered on "Add page"
+                    self.scanned = detection.page
+                    self.page_frame = detection.frame
+                    self.page_quad = detection.quad
+
+                    # Redactions are applied when the pane is drawn, so the
+                    # page itself is never modified
+                    self.preview = self.scanned
+                    self.document_dirty = True
+
+                # Add the page by itself once it has settled, unless the
+                # operator is busy marking areas to white out
+                if self.auto_capture_enabled and not self.selecting and self.scanned is not None \
+                        and self.auto_capture.update(detection.timestamp, detection.quad, detection.frame):
+                    self.handle_scan()
+                    self.speak("Page added")
+
+            with self.metrics.stage('camera_pane'):
                 # Ensure max_width and max_height are valid
                 max_width = self.camera_frame.winfo_width()
                 max_height = self.camera_frame.winfo_height()
                 if max_width > 0 and max_height > 0:
-                    camera_frame = self.resize_image_to_fit(camera_frame, max_width, max_height)
-                    camera_image = Image.fromarray(camera_frame)
-                    camera_photo = ImageTk.PhotoImage(image=camera_image)
-                    
-                    # Display camera frame in camera label
-                    self.camera_label.configure(image=camera_photo)
-                    self.camera_label.image = camera_photo
-
-                if self.scanned is not None:
-                    # Apply any whitened rectangles
-                    if self.whitened_rects:
-                        preview_to_show = self.preview.copy()
-                        for (start, end) in self.whitened_rects:
-                            cv2.rectangle(preview_to_show, start, end, 255, -1)
-                    else:
-                        preview_to_show = self.preview
-
-                    preview_image = Image.fromarray(preview_to_show)
-                    preview_photo = ImageTk.PhotoImage(image=preview_image)
-                    self.document_label.configure(image=preview_photo)
-                    self.document_label.image = preview_photo
+                    # Shrink the frame straight into the pane's buffer and draw
+                    # the overlays there, so the shared capture frame stays
+                    # untouched for the detector. Normalizing the small copy is
+                    # much cheaper than normalizing the full frame.
+                    size = fit_size(frame.shape[1], frame.shape[0], max_width, max_height)
+                    camera_frame = self.camera_pane.render(frame, size, cv2.COLOR_BGR2RGB)
+                    cv2.normalize(camera_frame, camera_frame, 0, 255, cv2.NORM_MINMAX)
+                    scale = np.array([size[0] / frame.shape[1], size[1] / frame.shape[0]])
+                    x1, y1, x2, y2 = (np.array(self.ROI) * np.tile(size, 2)).astype(int)
+                    cv2.rectangle(camera_frame, (x1, y1), (x2, y2), (0, 0, 255), 1)
+                    window = self.detector.window
+                    if window is not None:
+                        x1, y1, x2, y2 = (np.array(window) * np.tile(scale, 2)).astype(int)
+                        cv2.rectangle(camera_frame, (x1, y1), (x2, y2), (255, 160, 0), 1)
+                    if self.quad is not None:
+                        cv2.drawContours(camera_frame, [(self.quad * scale).astype(np.int32)], -1,
+                                         (0, 255, 0), 2)
 
-            self.root.after(10, self.update_video)
+                    # Display camera frame in camera label
+                    with self.metrics.stage('camera_photo'):
+                        self.camera_pane.show()
+
+            # The page only changes with a new detection or an edit
+            if self.scanned is not None and self.document_dirty:
+                with self.metrics.stage('document_pane'):
+                    # Apply any whitened areas
+                    self.redactions.apply(self.document_pane.render(self.preview))
+
+                    with self.metrics.stage('document_photo'):
+                        self.document_pane.show()
+                    self.document_dirty = False
+
+        self.update_metrics()
+        # Tells the scheduler when the shown frame was captured
+        return latest.timestamp if latest is not None else None
+
+    def toggle_metrics(self, event=None):
+        # Timing stays on while snapshots are being exported
+        self.metrics_visible = not self.metrics_visible
+        self.metrics.enabled = self.metrics_visible or self.metrics_exporter is not None
+        if self.metrics_visible:
+            self.metrics_label.pack(after=self.status_label, pady=(0, 5))
+        else:
+            self.metrics_label.pack_forget()
+
+    def update_metrics(self):
+        # Refresh the overlay twice a second and export snapshots if asked to
+        if not self.metrics.enabled:
+            return
+        now = time.monotonic()
+        if self.metrics_visible and now - self.last_overlay >= 0.5:
+            self.last_overlay = now
+            self.metrics_var.set(self.metrics.overlay_text())
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.maybe_export(self.metrics)
 
     def handle_scan(self):
+        self.resume_thread.join()  # A resumed session must be in place first
         if self.scanned is not None:
             if not self.scanning:
                 self.scanning = True
-                self.pdf = FPDF(orientation="P", unit="mm", format="A4")
+                # Pages are streamed to a partial file until the PDF is saved
+                timestamp = datetime.now().strftime("%m-%d-%y_%H-%M-%S")
+                partial_path = os.path.join(self.destination_folder,
+                                            f"scanned_document_{timestamp}.pdf.part")
+                self.pdf = PDFDocument(partial_path, self.A4_width, self.A4_height)
+                # Every page is also journaled so the session survives a crash
+                self.journal = SessionJournal.create(partial_name=os.path.basename(partial_path),
+                                                     page_width=self.A4_width,
+                                                     page_height=self.A4_height)
                 self.status_var.set("Starting a new scan session")
                 self.speak("Starting a new scan session")
             
-            # Apply whitening rectangles before saving
-            temp_preview = self.preview.copy()
-            if self.whitened_rects:
-                for (start, end) in self.whitened_rects:
-                    cv2.rectangle(temp_preview, start, end, 255, -1)
-
-            # Save the image with whitening applied
-            timestamp = datetime.now().strftime('%H-%M-%S')
-            image_path = os.path.join(self.destination_folder, f"temp_{timestamp}.jpg")
-            cv2.imwrite(image_path, temp_preview)
-        
-            # Add to PDF
-            self.pdf.add_page()
-            self.pdf.image(image_path, x=0, y=0, w=self.A4_width, h=self.A4_height)
-            os.remove(image_path)
-            
-            # Update status
-            self.status_var.set(f"Page added to PDF. Total pages: {self.pdf.page_no()}")
+            # Use the recent frames of this sheet, sharpest first, or else
+            # the frame that was on screen
+            candidates = self.detector.recent_candidates(self.BURST_WINDOW)
+            frames = [candidate.frame for candidate in candidates] or [self.page_frame]
+            quads = [candidate.quad for candidate in candidates] or [self.page_quad]
+
+            if self.DENOISE_FRAMES > 1:
+                # Fusing frames takes a while, so it runs on the page worker
+                # and the preview keeps going; update_video reports the result
+                self.page_jobs.append(self.page_worker.submit(
+                    self.finish_page, frames[:self.DENOISE_FRAMES], quads[:self.DENOISE_FRAMES],
+                    self.pdf, self.journal, self.redactions.copy()))
+                self.status_var.set("Adding page...")
+            else:
+                page_count = self.finish_page(frames[:1], quads[:1], self.pdf, self.journal,
+                                              self.redactions)
+                self.status_var.set(f"Page added to PDF. Total pages: {page_count}")
+
+    def finish_page(self, frames, quads, pdf, journal, redactions):
+        # Render the full resolution page, fused from several frames when
+        # more than one is given, then white out, encode, journal and append
+        # it to the PDF. Returns the page count.
+        with self.metrics.stage('scan_render'):
+            if len(frames) > 1:
+                fused = denoise_page(frames, quads, method=self.DENOISE_METHOD,
+                                     refine=self.DENOISE_REFINE)
+                temp_preview = enhance_page(fused, binarize=self.PAGE_MODE == BILEVEL,
+                                            method=self.BINARIZE_METHOD)
+            else:
+                # Every sheet has a new quad, so remap tables would never be
+                # reused here; a plain warpPerspective is faster
+                temp_preview = render_page(frames[0], quads[0],
+                                           binarize=self.PAGE_MODE == BILEVEL,
+                                           method=self.BINARIZE_METHOD)
+
+        # Apply whitened areas before saving. They are kept in page
+        # coordinates, so they land exactly on the full resolution page.
+        redactions.apply(temp_preview, keep=False)
+
+        with self.metrics.stage('scan_encode'):
+            page_image = encode_page(temp_preview, self.PAGE_MODE)
+        with self.metrics.stage('scan_write'):
+            journal.add_page(page_image, quad=quads[0].tolist(), mode=self.PAGE_MODE)
+            pdf.add_page(page_image)
+        return pdf.page_no()
+
+    def report_page_job(self, job):
+        # Show how a page finished on the page worker went; waits for it.
+        # Returns False if the page could not be added.
+        error = job.exception()
+        if error is not None:
+            logger.error("Could not add page", exc_info=error)
+            self.status_var.set(f"Could not add page: {error}")
+            self.speak("Could not add page")
+            return False
+        self.status_var.set(f"Page added to PDF. Total pages: {job.result()}")
+        return True
 
     def handle_save(self):
-        if self.scanned is not None and self.pdf is not None:
+        self.resume_thread.join()
+        # Pages still being fused go in first
+        failed = sum(not self.report_page_job(job) for job in self.page_jobs)
+        self.page_jobs = []
+        if self.pdf is not None:
             # Save the PDF
             timestamp = datetime.now().strftime("%m-%d-%y_%H-%M-%S")
             pdf_filename = os.path.join(self.destination_folder, f"scanned_document_{timestamp}.pdf")
-            self.pdf.output(pdf_filename, "F")
+            with self.metrics.stage('save'):
+                self.pdf.output(pdf_filename)
             
             # Update status and speak
-            self.status_var.set("PDF saved successfully")
-            self.speak("PDF saved successfully")
+            if failed:
+                self.status_var.set(f"PDF saved, but {failed} page(s) could not be added")
+                self.speak("PDF saved, but some pages are missing")
+            else:
+                self.status_var.set("PDF saved successfully")
+                self.speak("PDF saved successfully")
             
-            # Reset PDF object
+            # Reset PDF object; the saved session no longer needs its journal
             self.pdf = None
+            self.journal.remove()
+            self.journal = None
             self.scanning = False  # Reset scanning state
         else:
             self.status_var.set("No document scanned yet or no pages added")
@@ -386,23 +578,25 @@ class ScannerGUI:
             if self.selecting:
                 self.status_var.set("Modify mode activated")
                 self.speak("Modify mode activated. Select the portion that you want to exclude in scanning.")
-                self.whitened_rects = []  # Reset whitened rectangles
-                self.preview = self.scanned.copy()
+                self.redactions.clear()  # Reset whitened areas
+                self.document_dirty = True
                 
                 # Bind mouse events for editing
-                self.document_label.bind('<Button-1>', self.start_rect)
-                self.document_label.bind('<B1-Motion>', self.draw_rect)
-                self.document_label.bind('<ButtonRelease-1>', self.end_rect)
+                self.document_canvas.bind('<Button-1>', self.start_rect)
+                self.document_canvas.bind('<B1-Motion>', self.draw_rect)
+                self.document_canvas.bind('<ButtonRelease-1>', self.end_rect)
             else:
                 self.status_var.set("Modify mode deactivated")
                 self.speak("Modify mode deactivated.")
-                self.whitened_rects = []  # Clear the list of whitened rectangles when exiting erase mode
-                self.preview = self.scanned.copy()
+                self.redactions.clear()  # Clear the whitened areas when exiting erase mode
+                self.document_dirty = True
                 
                 # Unbind mouse events
-                self.document_label.unbind('<Button-1>')
-                self.document_label.unbind('<B1-Motion>')
-                self.document_label.unbind('<ButtonRelease-1>')
+                self.document_canvas.unbind('<Button-1>')
+                self.document_canvas.unbind('<B1-Motion>')
+                self.document_canvas.unbind('<ButtonRelease-1>')
+                self.document_pane.clear_selection()
+                self.drawing = False
 
     def start_rect(self, event):
         if self.selecting:
@@ -414,58 +608,62 @@ class ScannerGUI:
         if self.selecting and self.drawing:
             self.rect_end = (event.x, event.y)
             
-            # Create a copy of the preview to draw temporary rectangle
-            temp_preview = self.preview.copy()
-            
-            # Convert preview to RGB for drawing
-            temp_preview_rgb = cv2.cvtColor(temp_preview, cv2.COLOR_GRAY2RGB)
-            
-            # Draw the rectangle
-            x_min, y_min = min(self.rect_start[0], self.rect_end[0]), min(self.rect_start[1], self.rect_end[1])
-            x_max, y_max = max(self.rect_start[0], self.rect_end[0]), max(self.rect_start[1], self.rect_end[1])
-            cv2.rectangle(temp_preview_rgb, (x_min, y_min), (x_max, y_max), (0, 0, 255), 2)
-            
-            # Convert back to PhotoImage
-            temp_preview_image = Image.fromarray(temp_preview_rgb)
-            temp_preview_photo = ImageTk.PhotoImage(image=temp_preview_image)
-            
-            # Update label
-            self.document_label.configure(image=temp_preview_photo)
-            self.document_label.image = temp_preview_photo
+            # Move the selection rectangle; the page image is left alone
+            self.document_pane.select(self.rect_start, self.rect_end)
 
     def end_rect(self, event):
         if self.selecting and self.drawing:
             self.drawing = False
             self.rect_end = (event.x, event.y)
+            self.document_pane.clear_selection()
             
-            # Get rectangle coordinates
-            x_min, y_min = min(self.rect_start[0], self.rect_end[0]), min(self.rect_start[1], self.rect_end[1])
-            x_max, y_max = max(self.rect_start[0], self.rect_end[0]), max(self.rect_start[1], self.rect_end[1])
-            
-            # Store rectangle coordinates
-            self.whitened_rects.append(((x_min, y_min), (x_max, y_max)))
-            
-            # White out the selected region
-            cv2.rectangle(self.preview, (x_min, y_min), (x_max, y_max), 255, -1)
-            
-            # Update the preview with the new rectangle
-            temp_preview = self.preview.copy()
-            temp_preview_image = Image.fromarray(temp_preview)
-            temp_preview_photo = ImageTk.PhotoImage(temp_preview_image)
+            # Store the area in page coordinates, whatever size the preview
+            # is shown at
+            view = PageView(self.document_pane.size, self.document_pane.offset())
+            self.redactions.add(view.to_page(*self.rect_start), view.to_page(*self.rect_end))
             
-            # Update label
-            self.document_label.configure(image=temp_preview_photo)
-            self.document_label.image = temp_preview_photo
+            # Update the preview with the new area on the next frame
+            self.document_dirty = True
+
+    def resume_session(self):
+        # Runs on a background thread at startup, so it must not touch Tk
+        # Resume the most recent session no other running instance owns by
+        # replaying its journal into a new partial PDF; journaled pages are
+        # already encoded, so this is cheap
+        self.journal = resume_latest()
+        if self.journal is None:
+            return
+        if self.journal.page_no() == 0:
+            self.journal.remove()  # Crashed before its first page was added
+            self.journal = None
+            return
+        partial_path = os.path.join(self.destination_folder, self.journal.session['partial_name'])
+        if os.path.exists(partial_path):
+            os.remove(partial_path)  # Left behind by the crashed session
+        self.pdf = self.journal.build_pdf(partial_path, self.journal.session['page_width'],
+                                          self.journal.session['page_height'])
+        self.scanning = True
+        self.resumed_pages = self.pdf.page_no()
 
     def handle_open_folder(self):
         os.startfile(self.destination_folder)
 
     def handle_exit(self):
+        self.resume_thread.join()
+        # Queued pages would only be discarded below; wait for the running one
+        self.page_worker.shutdown(wait=True, cancel_futures=True)
         self.speech_queue.put(None)  # Signal to exit the speech thread
-        self.cap.release()
+        if self.pdf is not None:
+            # Unsaved pages are dropped, as before; only a crash keeps them
+            self.pdf.discard()
+            self.journal.remove()
+        self.scheduler.stop()
+        self.detector.stop()
+        self.cameras.stop()
         self.root.quit()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
     root = tk.Tk()
     root.state('zoomed') 
     app = ScannerGUI(root)